@@ -25,25 +25,24 @@ import pandas as pd
 
 
 try:  # Tries to import local dependencies (pypi install)
-    from SearchStrategyAnalysis.appTrial import Trial, Experiment, Parameters, saveFileAsExperiment, Datapoint, defineOwnSoftware
+    from SearchStrategyAnalysis.appTrial import Trial, Experiment, Parameters, saveFileAsExperiment, Datapoint, defineOwnSoftware, \
+        saveExperimentArchive, loadExperimentArchive, readParameterFile, writeParameterFile
     import SearchStrategyAnalysis.heatmap
-    
+    from SearchStrategyAnalysis.searchMetrics import trialMetrics, cachedExperimentMetrics, cachedMultiGoalMetrics
+    from SearchStrategyAnalysis.autoLocation import estimateLocations
+    from SearchStrategyAnalysis.classifier import classifyStrategies, notRecognized
+
 except: #For local path
     from appTrial import Trial, Experiment, Parameters, saveFileAsExperiment, Datapoint, \
-        defineOwnSoftware
+        defineOwnSoftware, saveExperimentArchive, loadExperimentArchive, readParameterFile, writeParameterFile
     import heatmap
+    from searchMetrics import trialMetrics, cachedExperimentMetrics, cachedMultiGoalMetrics
+    from autoLocation import estimateLocations
+    from classifier import classifyStrategies, notRecognized
 from scipy.stats import norm
 import re
 import traceback
 
-try:  # Imports MATLAB engine if available
-    import matlab.engine
-
-    canUseMatlab = True
-except:  # Notify user that MATLAB is unavailable
-    print("MATLAB Engine Unavailable")
-    canUseMatlab = False
-
 if sys.version_info < (3, 0, 0):  # tkinter names for python 2
     print("Update to Python3 for best results... You may encounter errors")
     from Tkinter import *
@@ -76,12 +75,15 @@ if not os.path.exists("output/plots"):
     os.makedirs("output/plots")
 if not os.path.exists("output/heatmaps"):
     os.makedirs("output/heatmaps")
+if not os.path.exists("output/cache"):
+    os.makedirs("output/cache")
 
 logfilename = "output/logs/logfile " + str(strftime("%Y_%m_%d %I_%M_%S_%p", localtime())) + ".log"  # name of the log file for the run
 logging.basicConfig(filename=logfilename, level=logging.DEBUG)  # set the default log type to INFO, can be set to DEBUG for more detailed information
 csvfilename = "output/results/results " + str(strftime("%Y_%m_%d %I_%M_%S_%p", localtime()))  # name of the default results file
 theFile = ""
 fileDirectory = ""
+archiveDirectory = ""  # an experiment archive opened instead of vendor files
 goalPosVar = "0,0"
 mazeDiamVar = "300"
 goalDiamVar = "10"
@@ -92,6 +94,12 @@ thigmotaxisZoneSizeVar = "15"
 outputFile = csvfilename
 fileFlag = 0
 probeCutVar = math.inf  # stop probe trials at X seconds, inf = no cutoff
+loadWorkersVar = os.cpu_count() or 1  # processes used to parse a directory of files, 1 = serial
+if _platform in ("win32", "darwin"):  # no safe fork here, spawned workers would re-run the GUI start up
+    loadWorkersVar = 1
+cacheDirectoryVar = "output/cache"  # parsed trials are kept here so unchanged files are not parsed again
+coverageGridVar = None  # cells per side of the coverage grid, None = the original 10x10 measure
+circularCoverageVar = False  # only count coverage grid cells inside the circular maze
 
 defaultParams = Parameters(name="Default", ipeMaxVal=125, headingMaxVal=40, distanceToSwimMaxVal=30,
                            distanceToPlatMaxVal=30, distanceToSwimMaxVal2=50, distanceToPlatMaxVal2=50,
@@ -181,6 +189,10 @@ useEntropy = BooleanVar()
 useEntropy.set(False)
 truncate = BooleanVar()
 truncate.set(False)
+coverageGridStringVar = StringVar()
+coverageGridStringVar.set("Default")
+circularCoverage = BooleanVar()
+circularCoverage.set(False)
 rois = []
 destroyedroot = False
 
@@ -288,6 +300,8 @@ class mainClass:
         self.fileMenu.add_command(label="Open File...", accelerator=accelF,
                                   command=self.openFile)  # add buttons in the menus
         self.fileMenu.add_command(label="Open Directory...", accelerator=accelD, command=self.openDir)
+        self.fileMenu.add_command(label="Open Archive...", command=self.openArchive)
+        self.fileMenu.add_command(label="Export Archive...", command=self.exportArchive)
         self.fileMenu.add_separator()  # adds a seperator
         self.fileMenu.add_command(label="Generate Heatmap", command=lambda: self.generateHeatmap(root))
         self.fileMenu.add_separator()  # adds a seperator
@@ -480,15 +494,14 @@ class mainClass:
         self.manualForAllL.bind("<Leave>", self.on_leave)
         rowCount = rowCount + 1
 
-        if canUseMatlab:
-            self.entropyL = Label(self.paramFrame, text="Run entropy calculation: ",
-                                  bg="white")  # label for the tickbox
-            self.entropyL.grid(row=rowCount, column=0, sticky=E)  # placed here
-            self.entropyC = Checkbutton(self.paramFrame, variable=useEntropy, bg="white")  # the actual tickbox
-            self.entropyC.grid(row=rowCount, column=1)
-            self.entropyL.bind("<Enter>", partial(self.on_enter, "Calculates the entropy of the trial (slow)"))
-            self.entropyL.bind("<Leave>", self.on_leave)
-            rowCount = rowCount + 1
+        self.entropyL = Label(self.paramFrame, text="Run entropy calculation: ",
+                              bg="white")  # label for the tickbox
+        self.entropyL.grid(row=rowCount, column=0, sticky=E)  # placed here
+        self.entropyC = Checkbutton(self.paramFrame, variable=useEntropy, bg="white")  # the actual tickbox
+        self.entropyC.grid(row=rowCount, column=1)
+        self.entropyL.bind("<Enter>", partial(self.on_enter, "Calculates the spatial entropy of the trial"))
+        self.entropyL.bind("<Leave>", self.on_leave)
+        rowCount = rowCount + 1
 
         self.truncateL = Label(self.paramFrame, text="Truncate trials when animal reaches goal location: ",
                                bg="white")  # label for the tickbox
@@ -498,6 +511,25 @@ class mainClass:
         self.truncateL.bind("<Enter>",
                             partial(self.on_enter, "Will end the trial onces the animal reaches the goal location."))
         self.truncateL.bind("<Leave>", self.on_leave)
+        rowCount = rowCount + 1
+
+        self.coverageGridL = Label(self.paramFrame, text="Coverage grid size (cells per side): ", bg="white")
+        self.coverageGridL.grid(row=rowCount, column=0, sticky=E)
+        self.coverageGridE = Entry(self.paramFrame, textvariable=coverageGridStringVar)
+        self.coverageGridE.grid(row=rowCount, column=1)
+        self.coverageGridL.bind("<Enter>", partial(self.on_enter,
+                                                   "Grid used for percent of maze traversed. Default is the original 10x10 measure"))
+        self.coverageGridL.bind("<Leave>", self.on_leave)
+        rowCount = rowCount + 1
+
+        self.circularCoverageL = Label(self.paramFrame, text="Only count coverage cells inside the maze: ",
+                                       bg="white")  # label for the tickbox
+        self.circularCoverageL.grid(row=rowCount, column=0, sticky=E)  # placed here
+        self.circularCoverageC = Checkbutton(self.paramFrame, variable=circularCoverage, bg="white")  # the actual tickbox
+        self.circularCoverageC.grid(row=rowCount, column=1)
+        self.circularCoverageL.bind("<Enter>", partial(self.on_enter,
+                                                       "Percent traversed ignores grid cells outside the circular maze (needs a grid size)"))
+        self.circularCoverageL.bind("<Leave>", self.on_leave)
 
         useManualForAllFlag = useManualForAll.get()
         useEntropyFlag = useEntropy.get()
@@ -669,8 +701,10 @@ class mainClass:
         global theFile
         global fileDirectory
         global fileFlag
+        global archiveDirectory
         fileFlag = 1
         fileDirectory = ""
+        archiveDirectory = ""
         theFile = filedialog.askopenfilename()  # look for xlsx and xls files
         self.calculateButton['state'] = 'normal'
 
@@ -679,20 +713,58 @@ class mainClass:
         global fileDirectory
         global theFile
         global fileFlag
+        global archiveDirectory
         fileFlag = 0
         theFile = ""
+        archiveDirectory = ""
         self.calculateButton['state'] = 'normal'
         fileDirectory = filedialog.askdirectory(mustexist=TRUE)
 
+    def openArchive(self):  # open dialog to get an experiment archive
+        logging.debug("Open Archive...")
+        global fileDirectory
+        global theFile
+        global fileFlag
+        global archiveDirectory
+        fileFlag = 0
+        theFile = ""
+        fileDirectory = ""
+        archiveDirectory = filedialog.askdirectory(mustexist=TRUE)
+        self.calculateButton['state'] = 'normal'
+
+    def exportArchive(self):  # saves the chosen files as an experiment archive
+        logging.debug("Export Archive...")
+        if theFile == "" and fileDirectory == "":
+            messagebox.showwarning('No file or directory', 'Please upload a file or directory before exporting an archive.')
+            return
+        directory = filedialog.askdirectory()
+        if directory == "":
+            return
+        theStatus.set("Exporting archive...")
+        self.updateTasks()
+        experiment = self.loadExperiment(softwareStringVar.get())
+        if experiment is not None:
+            try:
+                saveExperimentArchive(experiment, directory)
+            except TypeError as error:
+                logging.error("Could not export archive: " + str(error))
+                messagebox.showwarning('Archive Error', 'The trial information could not be saved: ' + str(error))
+        theStatus.set('Waiting for user input...')
+
+    def loadExperiment(self, software):  # the experiment from the open archive, or parsed from the chosen files
+        if archiveDirectory != "":
+            return loadExperimentArchive(archiveDirectory)
+        return saveFileAsExperiment(software, theFile, fileDirectory, loadWorkersVar, cacheDirectoryVar)
+
     def generateHeatmap(self, root):
         global softwareStringVar
         global fileDirectory
         global theFile
         software = softwareStringVar.get()
-        if theFile == "" and fileDirectory == "":
+        if theFile == "" and fileDirectory == "" and archiveDirectory == "":
             messagebox.showwarning('No file or directory', 'Please upload a file or directory before attempting to generate heatmap.')
         else:
-            experiment = saveFileAsExperiment(software, theFile, fileDirectory)
+            experiment = self.loadExperiment(software)
             self.guiHeatmap(experiment)
 
     def on_enter(self, text, event):
@@ -783,10 +855,25 @@ class mainClass:
         global useManualForAllFlag
         global useEntropyFlag
         global truncateFlag
+        global coverageGridVar
+        global circularCoverageVar
         manualFlag = useManual.get()
         useManualForAllFlag = useManualForAll.get()
         useEntropyFlag = useEntropy.get()
         truncateFlag = truncate.get()
+        circularCoverageVar = circularCoverage.get()
+        coverageGridText = coverageGridStringVar.get().strip()
+        if coverageGridText.lower() in ("", "default"):  # the original 10x10 measure
+            coverageGridVar = None
+        else:
+            try:
+                coverageGridVar = int(coverageGridText)
+                if coverageGridVar < 1:
+                    raise ValueError(coverageGridText)
+            except ValueError:
+                logging.error("Invalid coverage grid size: " + coverageGridText)
+                messagebox.showwarning('Input Error', 'The coverage grid size must be a whole number or Default')
+                return
         goalPosVar = goalPosStringVar.get()
         goalDiamVar = goalDiamStringVar.get()
         mazeDiamVar = mazeDiamStringVar.get()
@@ -802,11 +889,7 @@ class mainClass:
         except:
             pass
         theStatus.set("Loading Files...")
-        self.mainCalculate(goalPosVar, goalDiamVar)
-
-        for roi in rois:
-            print("Running for ROI: " + roi[0])
-            self.mainCalculate(roi[0], roi[1])
+        self.mainCalculate(goalPosVar, goalDiamVar, rois)  # the ROIs are evaluated in the same pass
 
     def otherROI(self):
         logging.debug("Opening ROI menu")
@@ -938,38 +1021,7 @@ class mainClass:
         self.headingIndirectCustom = StringVar()
 
         try:
-            with open('customobjs.pickle', 'rb') as f:
-                ipeMaxVal, headingMaxVal, distanceToSwimMaxVal, distanceToPlatMaxVal, distanceToSwimMaxVal2, \
-                distanceToPlatMaxVal2, corridorAverageMinVal, directedSearchMaxDistance, focalMinDistance, \
-                focalMaxDistance, semiFocalMinDistance, semiFocalMaxDistance, corridoripeMaxVal, annulusCounterMaxVal, \
-                quadrantTotalMaxVal, chainingMaxCoverage, percentTraversedMaxVal, percentTraversedMinVal, \
-                distanceToCentreMaxVal, thigmoMinDistance, smallThigmoMinVal, fullThigmoMinVal, ipeIndirectMaxVal, \
-                percentTraversedRandomMaxVal, headingIndirectMaxVal, useDirectPathV, useFocalSearchV, useDirectedSearchV, \
-                useIndirectV, useSemiFocalSearchV, useScanningV, useChainingV, useRandomV, useThigmoV = pickle.load(f)
-            params = Parameters(name="Custom", ipeMaxVal=float(ipeMaxVal), headingMaxVal=float(headingMaxVal),
-                                distanceToSwimMaxVal=float(distanceToSwimMaxVal),
-                                distanceToPlatMaxVal=float(distanceToPlatMaxVal),
-                                distanceToSwimMaxVal2=float(distanceToSwimMaxVal2),
-                                distanceToPlatMaxVal2=float(distanceToPlatMaxVal2),
-                                corridorAverageMinVal=float(corridorAverageMinVal),
-                                directedSearchMaxDistance=float(directedSearchMaxDistance),
-                                focalMinDistance=float(focalMinDistance), focalMaxDistance=float(focalMaxDistance),
-                                semiFocalMinDistance=float(semiFocalMinDistance),
-                                semiFocalMaxDistance=float(semiFocalMaxDistance),
-                                corridoripeMaxVal=float(corridoripeMaxVal),
-                                annulusCounterMaxVal=float(annulusCounterMaxVal),
-                                quadrantTotalMaxVal=int(quadrantTotalMaxVal),
-                                chainingMaxCoverage=float(chainingMaxCoverage),
-                                percentTraversedMaxVal=float(percentTraversedMaxVal),
-                                percentTraversedMinVal=float(percentTraversedMinVal),
-                                distanceToCentreMaxVal=float(distanceToCentreMaxVal),
-                                thigmoMinDistance=float(thigmoMinDistance), fullThigmoMinVal=float(fullThigmoMinVal),
-                                smallThigmoMinVal=float(smallThigmoMinVal), ipeIndirectMaxVal=float(ipeIndirectMaxVal),
-                                percentTraversedRandomMaxVal=float(percentTraversedRandomMaxVal),
-                                headingIndirectMaxVal=float(headingIndirectMaxVal),
-                                useDirect=useDirectPathV, useFocal=useFocalSearchV, useDirected=useDirectedSearchV,
-                                useIndirect=useIndirectV, useSemiFocal=useSemiFocalSearchV, useChaining=useChainingV,
-                                useScanning=useScanningV, useRandom=useRandomV, useThigmogaxis=useThigmoV)
+            params = readParameterFile()
         except:
             params = defaultParams
 
@@ -1310,18 +1362,7 @@ class mainClass:
                             useThigmogaxis=self.useThigmo.get())
 
         try:
-            with open('customobjs.pickle', 'wb') as f:
-                pickle.dump(
-                    [params.ipeMaxVal, params.headingMaxVal, params.distanceToSwimMaxVal, params.distanceToPlatMaxVal,
-                     params.distanceToSwimMaxVal2, params.distanceToPlatMaxVal2, params.corridorAverageMinVal,
-                     params.directedSearchMaxDistance, params.focalMinDistance, params.focalMaxDistance,
-                     params.semiFocalMinDistance, params.semiFocalMaxDistance, params.corridoripeMaxVal,
-                     params.annulusCounterMaxVal, params.quadrantTotalMaxVal, params.chainingMaxCoverage,
-                     params.percentTraversedMaxVal, params.percentTraversedMinVal, params.distanceToCentreMaxVal,
-                     params.thigmoMinDistance, params.smallThigmoMinVal, params.fullThigmoMinVal,
-                     params.ipeIndirectMaxVal, params.percentTraversedRandomMaxVal, params.headingIndirectMaxVal,
-                     params.useDirect, params.useFocal, params.useDirected, params.useIndirect, params.useSemiFocal,
-                     params.useChaining, params.useScanning, params.useRandom, params.useThigmotaxis], f)
+            writeParameterFile(params)
         except:
             pass
         try:
@@ -1336,19 +1377,7 @@ class mainClass:
             logging.debug("Resetting custom parameters")
             params = defaultParams
             try:
-                with open('customobjs.pickle', 'wb') as f:
-                    pickle.dump([params.ipeMaxVal, params.headingMaxVal, params.distanceToSwimMaxVal,
-                                 params.distanceToPlatMaxVal, params.distanceToSwimMaxVal2,
-                                 params.distanceToPlatMaxVal2, params.corridorAverageMinVal,
-                                 params.directedSearchMaxDistance, params.focalMinDistance, params.focalMaxDistance,
-                                 params.semiFocalMinDistance, params.semiFocalMaxDistance, params.corridoripeMaxVal,
-                                 params.annulusCounterMaxVal, params.quadrantTotalMaxVal, params.chainingMaxCoverage,
-                                 params.percentTraversedMaxVal, params.percentTraversedMinVal,
-                                 params.distanceToCentreMaxVal, params.thigmoMinDistance, params.smallThigmoMinVal,
-                                 params.fullThigmoMinVal, params.ipeIndirectMaxVal, params.percentTraversedRandomMaxVal,
-                                 params.headingIndirectMaxVal, params.useDirect, params.useFocal, params.useDirected,
-                                 params.useIndirect, params.useSemiFocal, params.useChaining, params.useScanning,
-                                 params.useRandom, params.useThigmotaxis], f)
+                writeParameterFile(params)
             except:
                 pass
             try:
@@ -1536,12 +1565,6 @@ class mainClass:
         self.updateTasks()
         n = 0
         i = 0
-        x = []
-        y = []
-        xMin = 0.0
-        yMin = 0.0
-        xMax = 0.0
-        yMax = 0.0
         dayStartStop = []
         trialStartStop = []
         dayVal = dayValStringVar.get()
@@ -1566,8 +1589,9 @@ class mainClass:
         else:
             trialStartStop = [int(trialVal), int(trialVal)]
 
-        for aTrial in aExperiment:  # for all the files we find
-            theStatus.set("Running " + theFile)
+        selected = np.zeros(len(aExperiment), dtype=bool)  # which trials go into the heatmap
+        theStatus.set("Running " + theFile)
+        for index, aTrial in enumerate(aExperiment):  # for all the files we find
             animal = ""
             if aExperiment.hasAnimalNames:
                 animal = aTrial.animal.replace("*", "")
@@ -1581,38 +1605,17 @@ class mainClass:
             else:
                 trialNum[animal] = 1
 
-            for aDatapoint in aTrial:
-                # Create data
-                if dayNum != 0 and trialNum != 0:
-                    if dayNum >= dayStartStop[0] and dayNum <= dayStartStop[1]:
-                        if trialNum[animal] >= trialStartStop[0] and trialNum[animal] <= trialStartStop[1]:
-                            if aDatapoint.getx() == "-" or aDatapoint.gety() == "-":
-                                continue
-                            x.append(float(aDatapoint.getx()))
-                            y.append(float(aDatapoint.gety()))
-
-                            if aDatapoint.getx() < xMin:
-                                xMin = aDatapoint.getx()
-                            if aDatapoint.gety() < yMin:
-                                yMin = aDatapoint.gety()
-                            if aDatapoint.getx() > xMax:
-                                xMax = aDatapoint.getx()
-                            if aDatapoint.gety() > yMax:
-                                yMax = aDatapoint.gety()
-                else:
-                    if aDatapoint.getx() == "-" or aDatapoint.gety() == "-":
-                        continue
-                    x.append(float(aDatapoint.getx()))
-                    y.append(float(aDatapoint.gety()))
-
-                    if aDatapoint.getx() < xMin:
-                        xMin = aDatapoint.getx()
-                    if aDatapoint.gety() < yMin:
-                        yMin = aDatapoint.gety()
-                    if aDatapoint.getx() > xMax:
-                        xMax = aDatapoint.getx()
-                    if aDatapoint.gety() > yMax:
-                        yMax = aDatapoint.gety()
+            # Create data
+            if dayNum != 0 and trialNum != 0:
+                if dayNum >= dayStartStop[0] and dayNum <= dayStartStop[1]:
+                    if trialNum[animal] >= trialStartStop[0] and trialNum[animal] <= trialStartStop[1]:
+                        selected[index] = True
+            else:
+                selected[index] = True
+
+        sampleMask = np.repeat(selected, aExperiment.lengths)  # expand the trial selection to the packed samples
+        x = aExperiment.x[sampleMask]
+        y = aExperiment.y[sampleMask]
 
         aFileName = "output/heatmaps/ " + "Day " + dayValStringVar.get() + " Trial " + trialValStringVar.get() + str(
             strftime("%Y_%m_%d %I_%M_%S_%p", localtime()))  # name of the log file for the run
@@ -1669,64 +1672,19 @@ class mainClass:
         except:
             logging.info("Couldn't update the GUI")
 
-    def unit_vector(self, vector):
-        """ Returns the unit vector of the vector.  """
-        if np.linalg.norm(vector) == 0:
-            return (0, 0)
-        try:
-            return vector / np.linalg.norm(vector)
-        except:
-            return (0, 0)
-
-    def angle_between(self, v1, v2):
-        v1_u = self.unit_vector(v1)
-        v2_u = self.unit_vector(v2)
-        return np.degrees(np.arccos(np.clip(np.dot(v1_u, v2_u), -1.0, 1.0)))
-
-    def calculateEntropy(self, theTrial, goalX, goalY):
-        xList = []
-        yList = []
-        try:
-            eng = matlab.engine.start_matlab()
-            logging.info("Matlab Engine Started")
-        except:
-            logging.info("Matlab Engine Running")
-        for aDatapoint in theTrial:
-            xList.append(float(aDatapoint.getx()))
-            yList.append(float(aDatapoint.gety()))
-
-        entropyResult = eng.Entropy(xList, yList, goalX, goalY)
-        return entropyResult
-
     def getAutoLocations(self, theExperiment, goalX, goalY, goalPosVar, mazeCentreX, mazeCentreY, mazeCentreVar,
-                         mazeDiamVar, software, goalDiamVar):
+                         mazeDiamVar, software, goalDiamVar, estimates=None):
+        # estimates, when given, is a dict shared by the calls for one experiment so its estimate is only made once
         platEstX = 0.0
         platEstY = 0.0
-        maxX = 0.0
-        minX = 0.0
-        maxY = 0.0
-        minY = 0.0
-        avMaxY = 0.0
-        avMinY = 0.0
-        avMaxX = 0.0
-        avMinX = 0.0
-        absMaxX = 0.0
-        absMaxY = 0.0
-        absMinX = 0.0
-        absMinY = 0.0
         mazeCentreEstX = 0.0
         mazeCentreEstY = 0.0
+        mazeDiamEst = 0.0
         mazeRadius = 0.0
         count = 0.0
         centreCount = 0.0
-        lastX = 0.0
-        lastY = 0.0
-        platMaxX = -100.0
-        platMinX = 100.0
-        platMaxY = -100.0
-        platMinY = 100.0
         platEstDiam = 0.0
-        maxLengthOfTrial = 50.0
+        platDiamEst = 0.0
         centreFlag = False
         platFlag = False
         platDiamFlag = False
@@ -1797,47 +1755,18 @@ class mainClass:
             theStatus.set(loggingText + "...")
             logging.debug(loggingText)
             self.updateTasks()
-            for aTrial in theExperiment:
-                for aDatapoint in aTrial:
-                    if aDatapoint.getx() == "-" or aDatapoint.getx() == "":  # throw out missing data
-                        continue
-                    if aDatapoint.gety() == "-" or aDatapoint.gety() == "":
-                        continue
-                    if aDatapoint.gettime() < maxLengthOfTrial:
-                        lastX = aDatapoint.getx()
-                        lastY = aDatapoint.gety()
-                        skipFlag = False
-                    else:
-                        skipFlag = True
-
-                    if aDatapoint.getx() > maxX:
-                        maxX = aDatapoint.getx()
-                    if aDatapoint.getx() < minX:
-                        minX = aDatapoint.getx()
-                    if aDatapoint.gety() > maxY:
-                        maxY = aDatapoint.gety()
-                    if aDatapoint.gety() < minY:
-                        minY = aDatapoint.gety()
-
-                    if maxX > absMaxX:
-                        absMaxX = maxX
-                    if minX < absMinX:
-                        absMinX = minX
-                    if maxY > absMaxY:
-                        absMaxY = maxY
-                    if minY < absMinY:
-                        absMinY = minY
-
-                    avMaxX += maxX
-                    avMaxY += maxY
-                    avMinX += minX
-                    avMinY += minY
-                    centreCount += 1.0
-
-                    if skipFlag == False:
-                        count += 1.0
-                        platEstX += lastX
-                        platEstY += lastY
+            # one streaming pass over the experiment: the maze is fitted to how far the cohort reaches in every
+            # direction and the goal to where the trials end
+            if estimates is None or "locations" not in estimates:
+                estimator = estimateLocations(theExperiment.x, theExperiment.y, theExperiment.offsets)
+                estimate = (estimator.estimate(), estimator.trialCount())
+                if estimates is not None:
+                    estimates["locations"] = estimate
+            else:
+                estimate = estimates["locations"]
+            (mazeCentreEstX, mazeCentreEstY, mazeDiamEst, platEstX, platEstY, platDiamEst), trialCount = estimate
+            centreCount = float(trialCount)
+            count = centreCount
 
             if centreCount < 1:  # we couldnt get the position
                 if centreFlag:
@@ -1866,27 +1795,19 @@ class mainClass:
             return
 
         if centreFlag:  # if we want an automatic centre position
-            avMaxX = avMaxX / centreCount  # get the average of the max X
-            avMaxY = avMaxY / centreCount  # max Y
-            avMinX = avMinX / centreCount  # min X
-            avMinY = avMinY / centreCount  # min Y
-            mazeCentreEstX = (avMaxX + avMinX) / 2  # estmiate the centre
-            mazeCentreEstY = (avMaxY + avMinY) / 2
             mazeCentreX = mazeCentreEstX
             mazeCentreY = mazeCentreEstY
             logging.info("Automatic maze centre calculated as: " + str(mazeCentreEstX) + ", " + str(mazeCentreEstY))
             print("Automatic maze centre calculated as: " + str(mazeCentreEstX) + ", " + str(mazeCentreEstY))
 
         if platFlag:  # automatic goal
-            platEstX = platEstX / count
-            platEstY = platEstY / count
             goalX = platEstX
             goalY = platEstY
             logging.info("Automatic goal position calculated as: " + str(platEstX) + ", " + str(platEstY))
             print("Automatic goal position calculated as: " + str(platEstX) + ", " + str(platEstY))
         if platDiamFlag:
-            platEstDiam = ((platMaxX - platMinX) + (platMaxY - platMinY)) / 2
-            if platEstDiam > 50 or platEstDiam < 1:
+            platEstDiam = platDiamEst
+            if not platEstDiam <= 50 or platEstDiam < 1:  # also catches a NaN estimate
                 platEstDiam = 10.0
                 print(
                     "Automatic goal diameter calculation failed. Defaulted to: " + str((math.ceil(float(platEstDiam)))))
@@ -1894,7 +1815,6 @@ class mainClass:
                 print("Automatic goal diameter calculated as: " + str((math.ceil(float(platEstDiam)))))
             logging.info("Automatic goal diameter calculated as: " + str((math.ceil(float(platEstDiam)))))
         if diamFlag:  # automatic diameter
-            mazeDiamEst = ((abs(absMaxX) + abs(absMinX)) + (abs(absMaxY) + abs(absMinY))) / 2
             logging.info("Automatic maze diameter calculated as: " + str(mazeDiamEst))
             print("Automatic maze diameter calculated as: " + str(mazeDiamEst))
             mazeDiamVar = mazeDiamEst
@@ -1902,252 +1822,55 @@ class mainClass:
         return (mazeCentreX, mazeCentreY, goalX, goalY, mazeDiamVar, mazeRadius, platEstDiam)
 
     def calculateValues(self, theTrial, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, thigmotaxisZoneSize,
-                        chainingRadius, fullThigmoZone, smallThigmoZone, mazeradius, dayNum, goalDiam):
+                        chainingRadius, fullThigmoZone, smallThigmoZone, mazeradius, dayNum, goalDiam, metrics=None):
         global mazeCentreVar
         global useEntropyFlag
         global truncateFlag
         theStatus.set("Calculating Search Strategies: " + str(theTrial))
 
-        i = 0
-        totalDistance = 0.0
-        latency = 1
-        mainLatency = 0.0
-        xSummed = 0.0
-        ySummed = 0.0
-        xAv = 0.0
-        yAv = 0.0
-        currentDistanceFromGoal = 0.0
-        distanceFromGoalSummed = 0.0
-        distanceAverage = 0.0
-        aX = 0.0
-        aY = 0.0
-
-        missingData = 0
-
-        distanceToCenterOfMaze = 0.0
-        totalDistanceToCenterOfMaze = 0.0
-        averageDistanceToCentre = 0.0
-
-        smallThigmoCounter = 0.0
-        fullThigmoCounter = 0.0
-        annulusCounter = 0.0
-        currentHeadingError = 0.0
-        distanceToSwimPathCentroid = 0.0
-        totalDistanceToSwimPathCentroid = 0.0
-        averageDistanceToSwimPathCentroid = 0.0
-
-        distanceToOldGoal = 0.0
-        totalDistanceToOldGoal = 0.0
-        averageDistanceToOldGoal = 0.0
-
-        startX = 0.0
-        startY = 0.0
-
-        oldItemX = 0.0
-        oldItemY = 0.0
-        corridorCounter = 0.0
-        quadrantOne = 0
-        quadrantTwo = 0
-        quadrantThree = 0
-        quadrantFour = 0
-        quadrantTotal = 0
-        x = 0
-        oldX = 0.0
-        oldY = 0.0
-        latencyCounter = 0.0
-        distanceFromStartToGoal = 0
-        arrayX = []
-        arrayY = []
-
-
-        for aDatapoint in theTrial:  # for each row in our sheet
-            if i == 0:
-                startX = aDatapoint.getx()
-                startY = aDatapoint.gety()
-                startTime = aDatapoint.gettime()
-
-            # Swim Path centroid
-            i += 1.0
-            xSummed += float(aDatapoint.getx())
-            ySummed += float(aDatapoint.gety())
-            aX = float(aDatapoint.getx())
-            aY = float(aDatapoint.gety())
-            print(aX)
-            arrayX.append(aX)
-            arrayY.append(aY)
-
-            # Average Distance
-            currentDistanceFromGoal = math.sqrt((goalX - aX) ** 2 + (goalY - aY) ** 2)
-
-            # in zones
-            distanceCenterToGoal = math.sqrt((mazeCentreX - goalX) ** 2 + (mazeCentreY - goalY) ** 2)
-            annulusZoneInner = distanceCenterToGoal - (chainingRadius / 2)
-            annulusZoneOuter = distanceCenterToGoal + (chainingRadius / 2)
-            distanceToCenterOfMaze = math.sqrt((mazeCentreX - aX) ** 2 + (mazeCentreY - aY) ** 2)
-            totalDistanceToCenterOfMaze += distanceToCenterOfMaze
-            distanceFromStartToGoal = math.sqrt((goalX - startX) ** 2 + (goalY - startY) ** 2)
-
-            distance = math.sqrt(abs(oldX - aX) ** 2 + abs(oldY - aY) ** 2)
-            distanceFromGoalSummed += currentDistanceFromGoal
-            totalDistance += distance
-            oldX = aX
-            oldY = aY
-
-            if distanceToCenterOfMaze > smallThigmoZone:  # calculate if we are in zones
-                smallThigmoCounter += 1.0
-            if distanceToCenterOfMaze > fullThigmoZone:
-                fullThigmoCounter += 1.0
-            if (distanceToCenterOfMaze >= annulusZoneInner) and (distanceToCenterOfMaze <= annulusZoneOuter):
-                annulusCounter += 1.0
-
-            a, b = 0, 0
-
-
-            if (mazeCentreX - aX) != 0:
-                centerArcTangent = math.degrees(math.atan((mazeCentreY - aY) / (mazeCentreX - aX)))
-
-            if aDatapoint.getx() >= mazeCentreX and aDatapoint.gety() >= mazeCentreY:
-                quadrantOne = 1
-            elif aDatapoint.getx() < mazeCentreX and aDatapoint.gety() >= mazeCentreY:
-                quadrantTwo = 1
-            elif aDatapoint.getx() >= mazeCentreX and aDatapoint.gety() < mazeCentreY:
-                quadrantThree = 1
-            elif aDatapoint.getx() < mazeCentreX and aDatapoint.gety() < mazeCentreY:
-                quadrantFour = 1
-
-            latency = aDatapoint.gettime() - startTime
-            if truncateFlag and currentDistanceFromGoal < float(goalDiam) / 2.0:
-                break
-
-        quadrantTotal = quadrantOne + quadrantTwo + quadrantThree + quadrantFour
-
-
-        spreadX = abs((mazeCentreX+mazeradius) - (mazeCentreX-mazeradius))
-        spreadY = abs((mazeCentreY+mazeradius) - (mazeCentreY-mazeradius))
-        normX = []
-        normY = []
-        for xx in arrayX:
-            normX.append(round((((xx - abs((mazeCentreX - mazeradius))) / spreadX)*10),0)*10)
-        for yy in arrayY:
-            normY.append(round((((yy - abs((mazeCentreY - mazeradius))) / spreadY)*10),0)*10)
-        XY = list(zip(normX,normY))
-        XY = list(dict.fromkeys(XY))
-        print(XY)
-        percentTraversed = len(XY)# turn our count into a percentage over how many cells we can visit
-        print(percentTraversed)
-        if percentTraversed > 100:
-            percentTraversed = 100
-
-        if i == 0:
-            i = 1
-        try:
-            xAv = xSummed / i  # get our average positions for the centroid
-            yAv = ySummed / i
-            swimPathCentroid = (xAv, yAv)
-        except:
-            swimPathCentroid = (0, 0)
-
-        startPoint = np.array([startX, startY])
-        goalPoint = np.array([goalX, goalY])
-
-        startToPlatVector = goalPoint - startPoint
-
-        if(goalX-startX != 0):
-            aArcTangent = math.degrees(math.atan((goalY - startY) / (goalX - startX)))
-        else:
-            aArcTangent = 0;
-
-        upperCorridor = aArcTangent + corridorWidth
-        lowerCorridor = aArcTangent - corridorWidth
-        corridorWidth = 0.0
-        totalHeadingError = 0.0
-        initialHeadingError = 0.0
-        initialHeadingErrorCount = 0
-
-        for aDatapoint in theTrial:  # go back through all values and calculate distance to the centroid
-
-            currentDistanceFromGoal = math.sqrt(
-                (goalX - aDatapoint.getx()) ** 2 + (goalY - aDatapoint.gety()) ** 2)
-            distanceToSwimPathCentroid = math.sqrt(
-                (xAv - aDatapoint.getx()) ** 2 + (yAv - aDatapoint.gety()) ** 2)
-            totalDistanceToSwimPathCentroid += distanceToSwimPathCentroid
-            distanceFromStartToCurrent = math.sqrt(
-                (aDatapoint.getx() - startX) ** 2 + (aDatapoint.gety() - startY) ** 2)
-
-            if oldItemX != 0 and aDatapoint.getx() - oldItemX != 0 and aDatapoint.getx() - startX != 0:
-                currentToPlat = np.subtract(np.array([goalX, goalY]), np.array([aDatapoint.getx(), aDatapoint.gety()]))
-                oldToCurrent = np.subtract(np.array([aDatapoint.getx(), aDatapoint.gety()]),
-                                           np.array([oldItemX, oldItemY]))
-                currentHeadingError = abs(self.angle_between(currentToPlat, oldToCurrent))
-                withinCorridor = math.degrees(math.atan((aDatapoint.gety() - startY) / (aDatapoint.getx() - startX)))
-                corridorWidth = abs(
-                    aArcTangent - abs(
-                        math.degrees(math.atan((aDatapoint.gety() - oldItemY) / (aDatapoint.getx() - oldItemX)))))
-                if float(lowerCorridor) <= float(withinCorridor) <= float(upperCorridor):
-                    corridorCounter += 1.0
-            if (aDatapoint.gettime() < 1.0):
-                initialHeadingError += currentHeadingError
-                initialHeadingErrorCount += 1
-
-            oldItemX = aDatapoint.getx()
-            oldItemY = aDatapoint.gety()
-            totalHeadingError += currentHeadingError
-            if truncateFlag and currentDistanceFromGoal < float(goalDiam) / 2.0:
-                break
-        try:
-            corridorAverage = corridorCounter / i
-            distanceAverage = distanceFromGoalSummed / i  # calculate our average distances to landmarks
-            averageDistanceToSwimPathCentroid = totalDistanceToSwimPathCentroid / i
-            averageDistanceToOldGoal = totalDistanceToOldGoal / i
-            averageDistanceToCentre = totalDistanceToCenterOfMaze / i
-            averageHeadingError = totalHeadingError / i
-        except:
-            i = 1
-            corridorAverage = corridorCounter / i
-            distanceAverage = distanceFromGoalSummed / i  # calculate our average distances to landmarks
-            averageDistanceToSwimPathCentroid = totalDistanceToSwimPathCentroid / i
-            averageDistanceToOldGoal = totalDistanceToOldGoal / i
-            averageDistanceToCentre = totalDistanceToCenterOfMaze / i
-            averageHeadingError = totalHeadingError / i
-
-        try:
-            averageInitialHeadingError = initialHeadingError / initialHeadingErrorCount
-        except:
-            averageInitialHeadingError = 0
-        cellCounter = 0.0  # initialize our cell counter
-
-        velocity = 0
-        idealDistance = distanceFromStartToGoal
-        if latency != 0:
-            try:
-                velocity = (totalDistance / latency)
-            except:
-                velocity = 0
-                pass
-        idealCumulativeDistance = 0.0
-        try:
-            sampleRate = (theTrial.datapointList[-1].gettime() - startTime) / (len(theTrial.datapointList) - 1)
-        except:
-            logging.info("Error with sample rate calculation")
-            sampleRate = 1
-        while idealDistance > math.ceil(float(goalDiam) / 2):
-            idealCumulativeDistance += idealDistance
-            idealDistance = (idealDistance - velocity * sampleRate)
-            if (idealCumulativeDistance > 1000000):
-                break
-
-        ipe = float(distanceFromGoalSummed - idealCumulativeDistance) * sampleRate
-
-        if ipe < 0:
-            ipe = 0
+        if metrics is None:  # not precomputed by experimentMetrics
+            metrics = trialMetrics(theTrial.t, theTrial.x, theTrial.y, goalX, goalY, mazeCentreX, mazeCentreY,
+                                   corridorWidth, chainingRadius, fullThigmoZone, smallThigmoZone, mazeradius, goalDiam,
+                                   truncateFlag, coverageGridVar, circularCoverageVar)
+        arrayX = theTrial.x[:metrics["truncatedLength"]]  # the (possibly truncated) path, as views on the trial columns
+        arrayY = theTrial.y[:metrics["truncatedLength"]]
 
         if useEntropyFlag:
-            entropyResult = self.calculateEntropy(theTrial, goalX, goalY)
+            entropyResult = metrics["entropy"]
         else:
             entropyResult = False
-        return corridorAverage, distanceAverage, averageDistanceToSwimPathCentroid, averageDistanceToCentre, averageHeadingError, percentTraversed, quadrantTotal, totalDistance, latency, fullThigmoCounter, smallThigmoCounter, annulusCounter, i, arrayX, arrayY, velocity, ipe, averageInitialHeadingError, entropyResult
-
-    def mainCalculate(self, goalPosVar=goalPosVar, goalDiamVar=goalDiamVar):
+        return metrics["corridorAverage"], metrics["distanceAverage"], metrics["averageDistanceToSwimPathCentroid"], \
+            metrics["averageDistanceToCentre"], metrics["averageHeadingError"], metrics["percentTraversed"], \
+            metrics["quadrantTotal"], metrics["totalDistance"], metrics["latency"], metrics["fullThigmoCounter"], \
+            metrics["smallThigmoCounter"], metrics["annulusCounter"], metrics["sampleCount"], arrayX, arrayY, \
+            metrics["velocity"], metrics["ipe"], metrics["averageInitialHeadingError"], entropyResult
+
+    def calculateExperimentValues(self, aExperiment, locations, corridorWidth, chainingRadius, thigmotaxisZoneSize):
+        # metric tables of every trial, one per getAutoLocations result; goals in the same maze share one pass
+        global truncateFlag
+        mazeCentreX, mazeCentreY, mazeRadius = locations[0][0], locations[0][1], locations[0][5]
+        if all(location[0] == mazeCentreX and location[1] == mazeCentreY and location[5] == mazeRadius
+               for location in locations):
+            smallThigmoZone = mazeRadius - math.ceil(thigmotaxisZoneSize / 2)
+            fullThigmoZone = mazeRadius - thigmotaxisZoneSize
+            return cachedMultiGoalMetrics(cacheDirectoryVar, aExperiment.t, aExperiment.x, aExperiment.y,
+                                          aExperiment.offsets, [location[2] for location in locations],
+                                          [location[3] for location in locations], mazeCentreX, mazeCentreY,
+                                          corridorWidth, chainingRadius, fullThigmoZone, smallThigmoZone, mazeRadius,
+                                          [location[6] for location in locations], truncateFlag, coverageGridVar,
+                                          circularCoverageVar, fingerprint=aExperiment.archiveKey)
+        metricTables = []
+        for mazeCentreX, mazeCentreY, goalX, goalY, mazeDiamVar, mazeRadius, goalDiam in locations:
+            smallThigmoZone = mazeRadius - math.ceil(thigmotaxisZoneSize / 2)
+            fullThigmoZone = mazeRadius - thigmotaxisZoneSize
+            metricTables.append(cachedExperimentMetrics(cacheDirectoryVar, aExperiment.t, aExperiment.x, aExperiment.y,
+                                                        aExperiment.offsets, goalX, goalY, mazeCentreX, mazeCentreY,
+                                                        corridorWidth, chainingRadius, fullThigmoZone, smallThigmoZone,
+                                                        mazeRadius, goalDiam, truncateFlag, coverageGridVar,
+                                                        circularCoverageVar, fingerprint=aExperiment.archiveKey))
+        return metricTables
+
+    def mainCalculate(self, goalPosVar=goalPosVar, goalDiamVar=goalDiamVar, rois=()):
         global softwareStringVar
         global params
         logging.debug("Calculate Called")
@@ -2155,34 +1878,7 @@ class mainClass:
         theStatus.set("Initializing")
 
         try:
-            with open('customobjs.pickle', 'rb') as f:
-                ipeMaxVal, headingMaxVal, distanceToSwimMaxVal, distanceToPlatMaxVal, distanceToSwimMaxVal2, distanceToPlatMaxVal2, corridorAverageMinVal, directedSearchMaxDistance, focalMinDistance, focalMaxDistance, semiFocalMinDistance, semiFocalMaxDistance, corridoripeMaxVal, annulusCounterMaxVal, quadrantTotalMaxVal, chainingMaxCoverage, percentTraversedMaxVal, percentTraversedMinVal, distanceToCentreMaxVal, thigmoMinDistance, smallThigmoMinVal, fullThigmoMinVal, ipeIndirectMaxVal, percentTraversedRandomMaxVal, headingIndirectMaxVal, useDirectPathV, useFocalSearchV, useDirectedSearchV, useIndirectV, useSemiFocalSearchV, useScanningV, useChainingV, useRandomV, useThigmoV = pickle.load(
-                    f)
-            params = Parameters(name="Custom", ipeMaxVal=float(ipeMaxVal), headingMaxVal=float(headingMaxVal),
-                                distanceToSwimMaxVal=float(distanceToSwimMaxVal),
-                                distanceToPlatMaxVal=float(distanceToPlatMaxVal),
-                                distanceToSwimMaxVal2=float(distanceToSwimMaxVal2),
-                                distanceToPlatMaxVal2=float(distanceToPlatMaxVal2),
-                                corridorAverageMinVal=float(corridorAverageMinVal),
-                                directedSearchMaxDistance=float(directedSearchMaxDistance),
-                                focalMinDistance=float(focalMinDistance), 
-                                focalMaxDistance=float(focalMaxDistance),
-                                semiFocalMinDistance=float(semiFocalMinDistance),
-                                semiFocalMaxDistance=float(semiFocalMaxDistance),
-                                corridoripeMaxVal=float(corridoripeMaxVal),
-                                annulusCounterMaxVal=float(annulusCounterMaxVal),
-                                quadrantTotalMaxVal=int(quadrantTotalMaxVal),
-                                chainingMaxCoverage=float(chainingMaxCoverage),
-                                percentTraversedMaxVal=float(percentTraversedMaxVal),
-                                percentTraversedMinVal=float(percentTraversedMinVal),
-                                distanceToCentreMaxVal=float(distanceToCentreMaxVal),
-                                thigmoMinDistance=float(thigmoMinDistance), fullThigmoMinVal=float(fullThigmoMinVal),
-                                smallThigmoMinVal=float(smallThigmoMinVal), ipeIndirectMaxVal=float(ipeIndirectMaxVal),
-                                percentTraversedRandomMaxVal=float(percentTraversedRandomMaxVal),
-                                headingIndirectMaxVal=float(headingIndirectMaxVal),
-                                useDirect=useDirectPathV, useFocal=useFocalSearchV, useDirected=useDirectedSearchV,
-                                useIndirect=useIndirectV, useSemiFocal=useSemiFocalSearchV, useChaining=useChainingV,
-                                useScanning=useScanningV, useRandom=useRandomV, useThigmogaxis=useThigmoV)
+            params = readParameterFile()
         except:
             params = defaultParams
 
@@ -2208,16 +1904,6 @@ class mainClass:
         smallThigmoZone = 0.0
         distanceCenterToGoal = 0.0
         totalTrialCount = 0.0
-        thigmotaxisCount = 0.0
-        randomCount = 0.0
-        scanningCount = 0.0
-        chainingCount = 0.0
-        directSearchCount = 0.0
-        focalSearchCount = 0.0
-        directPathCount = 0.0
-        indirectSearchCount = 0.0
-        notRecognizedCount = 0.0
-        semiFocalSearchCount = 0.0
         n = 0
         numOfRows = 0
         mazeCentreX, mazeCentreY = mazeCentre
@@ -2226,186 +1912,174 @@ class mainClass:
         autoFlag = False
         skipFlag = False
         software = softwareStringVar.get()
-        if (software == "auto"):
+        if (software == "auto" and archiveDirectory == ""):
             self.detectSoftwareType()
         software = softwareStringVar.get()
 
         try:
-            aExperiment = saveFileAsExperiment(software, theFile, fileDirectory)
+            aExperiment = self.loadExperiment(software)
         except Exception:
             show_message("No Input")
             print("Unexpected Error loading experiment")
             traceback.print_exc()
             return
 
-        mazeCentreX, mazeCentreY, goalX, goalY, mazeDiamVar, mazeRadius, goalDiamVar = self.getAutoLocations(
-            aExperiment, goalX, goalY, goalPosVar, mazeCentreX, mazeCentreY, mazeCentreVar, mazeDiamVar, software,
-            goalDiamVar)
+        goalPositions = [goalPosVar] + [roi[0] for roi in rois]
+        goalDiameters = [goalDiamVar] + [roi[1] for roi in rois]
+        estimates = {}  # the experiment is only estimated once, for the first goal that needs it
+        locations = [self.getAutoLocations(aExperiment, goalX, goalY, goalPos, mazeCentreX, mazeCentreY, mazeCentreVar,
+                                           mazeDiamVar, software, goalDiam, estimates)
+                     for goalPos, goalDiam in zip(goalPositions, goalDiameters)]
 
         thigmotaxisZoneSize = float(thigmotaxisZoneSizeVar)  # update the thigmotaxis zone
         chainingRadius = float(chainingRadiusVar)  # update the chaining radius
         corridorWidth = (int(corridorWidthVar) / 2)  # update the corridor width
 
-        smallThigmoZone = mazeRadius - math.ceil(thigmotaxisZoneSize / 2)  # update the smaller wall zone
-        fullThigmoZone = mazeRadius - thigmotaxisZoneSize  # and bigger wall zone
+        # the metrics of all trials for every goal, one table per goal with one row per trial
+        metricTables = self.calculateExperimentValues(aExperiment, locations, corridorWidth, chainingRadius,
+                                                      thigmotaxisZoneSize)
 
-        theStatus.set('Calculating Search Strategies...')  # update status bar
-        self.updateTasks()
-        currentOutputFile = outputFileStringVar.get() + str(goalPosVar) + ".csv"
-        logging.debug("Calculating search strategies")
-        try:  # try to open a csv file for output
-            f = open(currentOutputFile, 'wt')
-            writer = csv.writer(f, delimiter=',', quotechar='"')
-        except Exception:
-            traceback.print_exc()
-            logging.error("Cannot write to " + str(currentOutputFile))
-            return
+        for goalIndex, (goalPosVar, location, metricTable) in enumerate(zip(goalPositions, locations, metricTables)):
+            if goalIndex > 0:
+                print("Running for ROI: " + str(goalPosVar))
+            mazeCentreX, mazeCentreY, goalX, goalY, mazeDiamVar, mazeRadius, goalDiamVar = location
 
-        headersToWrite = []
-        try:
-            if aExperiment.hasDateInfo:
-                headersToWrite.extend(["Date", "Time", "Day"])
+            smallThigmoZone = mazeRadius - math.ceil(thigmotaxisZoneSize / 2)  # update the smaller wall zone
+            fullThigmoZone = mazeRadius - thigmotaxisZoneSize  # and bigger wall zone
 
-            headersToWrite.append("Trial")
-            if aExperiment.hasTrialNames:
-                headersToWrite.append("Name")
-            if aExperiment.hasAnimalNames:
-                headersToWrite.append("Animal")
-        except:
-            pass
-        headersToWrite.extend(
-            ["Trial name", "Trial Code", "Strategy", "IPE", "Velocity", "Distance covered", "Average distance to goal",
-             "Average heading error", "Percent of maze traversed", "Latency", "Score", "Initial heading error",
-             "Entropy", "Distance to swim path centroid", "Average distance to centre of maze",
-             "Percent in angular corridor", "Percent in annulus zone", "Percent in smaller thigmotaxis zone",
-             "Percent in full thigmotaxis zone", "Strategy (manual)"])
-        writer.writerow(headersToWrite)  # write to the csv
+            theStatus.set('Calculating Search Strategies...')  # update status bar
+            self.updateTasks()
+            currentOutputFile = outputFileStringVar.get() + str(goalPosVar) + ".csv"
+            logging.debug("Calculating search strategies")
+            try:  # try to open a csv file for output
+                f = open(currentOutputFile, 'wt')
+                writer = csv.writer(f, delimiter=',', quotechar='"')
+            except Exception:
+                traceback.print_exc()
+                logging.error("Cannot write to " + str(currentOutputFile))
+                return
 
-        dayNum = 0
-        trialNum = {}
-        curDate = None
-        for aTrial in aExperiment:
-            animal = aTrial.animal
-            if animal in trialNum:
-                trialNum[animal] += 1
-            else:
-                trialNum[animal] = 1
+            headersToWrite = []
+            try:
+                if aExperiment.hasDateInfo:
+                    headersToWrite.extend(["Date", "Time", "Day"])
+
+                headersToWrite.append("Trial")
+                if aExperiment.hasTrialNames:
+                    headersToWrite.append("Name")
+                if aExperiment.hasAnimalNames:
+                    headersToWrite.append("Animal")
+            except:
+                pass
+            headersToWrite.extend(
+                ["Trial name", "Trial Code", "Strategy", "IPE", "Velocity", "Distance covered", "Average distance to goal",
+                 "Average heading error", "Percent of maze traversed", "Latency", "Score", "Initial heading error",
+                 "Entropy", "Distance to swim path centroid", "Average distance to centre of maze",
+                 "Percent in angular corridor", "Percent in annulus zone", "Percent in smaller thigmotaxis zone",
+                 "Percent in full thigmotaxis zone", "Strategy (manual)"])
+            writer.writerow(headersToWrite)  # write to the csv
+
+            strategies, scores, strategyCounts = classifyStrategies(metricTable, params, mazeRadius)  # all trials at once
+            metricRows = metricTable.to_dict('records')
+
+            dayNum = 0
+            trialNum = {}
+            curDate = None
+            for trialIndex, aTrial in enumerate(aExperiment):
+                animal = aTrial.animal
+                if animal in trialNum:
+                    trialNum[animal] += 1
+                else:
+                    trialNum[animal] = 1
 
-            xSummed = 0.0
-            ySummed = 0.0
-            xAv = 0.0
-            yAv = 0.0
-
-            currentDistanceFromGoal = 0.0
-            distanceAverage = 0.0
-            aX = 0.0
-            aY = 0.0
-
-            distanceToCenterOfMaze = 0.0
-            totalDistanceToCenterOfMaze = 0.0
-            averageDistanceToCentre = 0.0
-
-            fullThigmoCounter = 0.0
-            smallThigmoCounter = 0.0
-            annulusCounter = 0.0
-
-            distanceToSwimPathCentroid = 0.0
-            totalDistanceToSwimPathCentroid = 0.0
-            averageDistanceToSwimPathCentroid = 0.0
-
-            distanceToOldGoal = 0.0
-            totalDistanceToOldGoal = 0.0
-            averageDistanceToOldGoal = 0.0
-
-            ipe = 0.0
-
-            startX = 0.0
-            startY = 0.0
-
-            areaCoverageGridSize = 19
-
-            corridorCounter = 0.0
-            quadrantOne = 0
-            quadrantTwo = 0
-            quadrantThree = 0
-            quadrantFour = 0
-            quadrantTotal = 0
-            score = 0
-            # Analyze the data ----------------------------------------------------------------------------------------------
-            corridorAverage, distanceAverage, averageDistanceToSwimPathCentroid, averageDistanceToCentre, averageHeadingError, \
-            percentTraversed, quadrantTotal, totalDistance, latency, fullThigmoCounter, smallThigmoCounter, annulusCounter, i, \
-            arrayX, arrayY, velocity, ipe, initialHeadingError, entropyResult = self.calculateValues(
-                aTrial, goalX, goalY, mazeCentreX,
-                mazeCentreY, corridorWidth, thigmotaxisZoneSize, chainingRadius, fullThigmoZone,
-                smallThigmoZone, mazeRadius, dayNum, goalDiamVar)
-
-            strategyType = ""
-            strategyManual = ""
-            # print(fullThigmoMinVal, smallThigmoMinVal, fullThigmoCounter/i, smallThigmoCounter/i)
-            # DIRECT SWIM
-            if ipe <= params.ipeMaxVal and averageHeadingError <= params.headingMaxVal and params.useDirect:  # direct path
-                directPathCount += 1.0
-                score = 3
-                strategyType = "Direct Path"
-            # FOCAL SEARCH
-            elif averageDistanceToSwimPathCentroid < (
-                    mazeRadius * params.distanceToSwimMaxVal / 100) and distanceAverage < (
-                    params.distanceToPlatMaxVal / 100 * mazeRadius) and totalDistance < params.focalMaxDistance and totalDistance > params.focalMinDistance and params.useFocal:  # Focal Search
-                focalSearchCount += 1.0
-                score = 2
-                strategyType = "Focal Search"
-            # DIRECTED SEARCH
-            elif corridorAverage >= params.corridorAverageMinVal / 100 and ipe <= params.corridoripeMaxVal and totalDistance < params.directedSearchMaxDistance and params.useDirected:  # directed search
-                directSearchCount += 1.0
-                score = 2
-                strategyType = "Directed Search"
-            # INDIRECT SEARCH
-            elif ipe < params.ipeIndirectMaxVal and averageHeadingError < params.headingIndirectMaxVal and params.useIndirect:  # Near miss
-                strategyType = "Indirect Search"
-                score = 2
-                indirectSearchCount += 1.0
-            # SEMI FOCAL SEARCH
-            elif averageDistanceToSwimPathCentroid < (
-                    mazeRadius * params.distanceToSwimMaxVal2 / 100) and distanceAverage < (
-                    params.distanceToPlatMaxVal2 / 100 * mazeRadius) and totalDistance < params.semiFocalMaxDistance and totalDistance > params.semiFocalMinDistance and params.useSemiFocal:  # Semi-Focal Search
-                semiFocalSearchCount += 1.0
-                score = 2
-                strategyType = "Semi-focal Search"
-            # CHAINING
-            elif float(
-                    annulusCounter / i) > params.annulusCounterMaxVal / 100 and quadrantTotal >= params.quadrantTotalMaxVal and percentTraversed < params.chainingMaxCoverage and params.useChaining:  # or 4 chaining
-                chainingCount += 1.0
-                score = 1
-                strategyType = "Chaining"
-            # SCANNING
-            elif params.percentTraversedMinVal <= percentTraversed and params.percentTraversedMaxVal > percentTraversed and averageDistanceToCentre <= (
-                    params.distanceToCentreMaxVal / 100 * mazeRadius) and params.useScanning:  # scanning
-                scanningCount += 1.0
-                score = 1
-                strategyType = "Scanning"
-            # THIGMOTAXIS
-            elif fullThigmoCounter / i >= params.fullThigmoMinVal / 100 and smallThigmoCounter / i >= params.smallThigmoMinVal / 100 and totalDistance > params.thigmoMinDistance and params.useThigmotaxis:  # thigmotaxis
-                thigmotaxisCount += 1.0
-                score = 0
-                strategyType = "Thigmotaxis"
-            # RANDOM SEARCH
-            elif percentTraversed >= params.percentTraversedRandomMaxVal and params.useRandom:  # random search
-                randomCount += 1.0
+                xSummed = 0.0
+                ySummed = 0.0
+                xAv = 0.0
+                yAv = 0.0
+
+                currentDistanceFromGoal = 0.0
+                distanceAverage = 0.0
+                aX = 0.0
+                aY = 0.0
+
+                distanceToCenterOfMaze = 0.0
+                totalDistanceToCenterOfMaze = 0.0
+                averageDistanceToCentre = 0.0
+
+                fullThigmoCounter = 0.0
+                smallThigmoCounter = 0.0
+                annulusCounter = 0.0
+
+                distanceToSwimPathCentroid = 0.0
+                totalDistanceToSwimPathCentroid = 0.0
+                averageDistanceToSwimPathCentroid = 0.0
+
+                distanceToOldGoal = 0.0
+                totalDistanceToOldGoal = 0.0
+                averageDistanceToOldGoal = 0.0
+
+                ipe = 0.0
+
+                startX = 0.0
+                startY = 0.0
+
+                areaCoverageGridSize = 19
+
+                corridorCounter = 0.0
+                quadrantOne = 0
+                quadrantTwo = 0
+                quadrantThree = 0
+                quadrantFour = 0
+                quadrantTotal = 0
                 score = 0
-                strategyType = "Random Search"
-            # NOT RECOGNIZED
-            else:  # cannot categorize
-                strategyType = "Not Recognized"
-                notRecognizedCount += 1.0
-                if manualFlag and not useManualForAllFlag:
-                    print("Day #", "Trial #", "Name", "Date", "Trial", "Strategy Type", "ipe", "velocity",
-                          "totalDistance", "distanceAverage", "averageHeadingError", "percentTraversed", "latency",
-                          "corridorAverage")
-                    print(dayNum, trialNum, aTrial.name, aTrial.date, aTrial.trial, strategyType, round(ipe, 2),
+                # Analyze the data ----------------------------------------------------------------------------------------------
+                corridorAverage, distanceAverage, averageDistanceToSwimPathCentroid, averageDistanceToCentre, averageHeadingError, \
+                percentTraversed, quadrantTotal, totalDistance, latency, fullThigmoCounter, smallThigmoCounter, annulusCounter, i, \
+                arrayX, arrayY, velocity, ipe, initialHeadingError, entropyResult = self.calculateValues(
+                    aTrial, goalX, goalY, mazeCentreX,
+                    mazeCentreY, corridorWidth, thigmotaxisZoneSize, chainingRadius, fullThigmoZone,
+                    smallThigmoZone, mazeRadius, dayNum, goalDiamVar, metricRows[trialIndex])
+
+                strategyType = str(strategies[trialIndex])
+                score = int(scores[trialIndex])
+                strategyManual = ""
+                if strategyType == notRecognized:  # cannot categorize
+                    if manualFlag and not useManualForAllFlag:
+                        print("Day #", "Trial #", "Name", "Date", "Trial", "Strategy Type", "ipe", "velocity",
+                              "totalDistance", "distanceAverage", "averageHeadingError", "percentTraversed", "latency",
+                              "corridorAverage")
+                        print(dayNum, trialNum, aTrial.name, aTrial.date, aTrial.trial, strategyType, round(ipe, 2),
+                              round(velocity, 2), round(totalDistance, 2), round(distanceAverage, 2),
+                              round(averageHeadingError, 2), round(percentTraversed, 2), round(latency, 2),
+                              round(corridorAverage, 2))
+                        # print("ipe: ", ipe, " Distance to centroid: ", averageDistanceToSwimPathCentroid, " Distance to plat: ", distanceAverage)
+                        plotName = "Strategy " + str(strategyType) + " Animal " + str(animal) + "  Day " + str(
+                            dayNum) + " Trial " + str(trialNum[animal])
+                        self.plotPoints(arrayX, arrayY, float(mazeDiamVar), float(mazeCentreX), float(mazeCentreY),
+                                        float(goalX), float(goalY), plotName,
+                                        ("Animal: " + str(animal) + "  Day/Trial: " + str(dayNum) + "/" + str(
+                                            trialNum[animal])), float(goalDiamVar))  # ask user for answer
+                        root.wait_window(self.top2)  # we wait until the user responds
+                        strategyManual = searchStrategyV  # update the strategyType to that of the user
+                        try:  # try and kill the popup window
+                            self.top2.destroy()
+                        except:
+                            pass
+
+                totalTrialCount += 1.0
+
+                n += 1
+                print(animal)
+                print("strategy: ", strategyType, "    ipe: ", round(ipe, 2), "    Heading: ",
+                      round(averageHeadingError, 2), "    Entropy: ", entropyResult)
+
+                if useManualForAllFlag:
+                    print("Day #", "Trial #", "Name", "Date", "Trial", "Strategy Type", "ipe", "velocity", "totalDistance",
+                          "distanceAverage", "averageHeadingError", "percentTraversed", "latency", "corridorAverage")
+                    print(dayNum, trialNum[animal], aTrial.name, aTrial.date, aTrial.trial, strategyType, round(ipe, 2),
                           round(velocity, 2), round(totalDistance, 2), round(distanceAverage, 2),
                           round(averageHeadingError, 2), round(percentTraversed, 2), round(latency, 2),
                           round(corridorAverage, 2))
-                    # print("ipe: ", ipe, " Distance to centroid: ", averageDistanceToSwimPathCentroid, " Distance to plat: ", distanceAverage)
                     plotName = "Strategy " + str(strategyType) + " Animal " + str(animal) + "  Day " + str(
                         dayNum) + " Trial " + str(trialNum[animal])
                     self.plotPoints(arrayX, arrayY, float(mazeDiamVar), float(mazeCentreX), float(mazeCentreY),
@@ -2414,64 +2088,35 @@ class mainClass:
                                         trialNum[animal])), float(goalDiamVar))  # ask user for answer
                     root.wait_window(self.top2)  # we wait until the user responds
                     strategyManual = searchStrategyV  # update the strategyType to that of the user
-                    try:  # try and kill the popup window
-                        self.top2.destroy()
-                    except:
-                        pass
-
-            totalTrialCount += 1.0
-
-            n += 1
-            print(animal)
-            print("strategy: ", strategyType, "    ipe: ", round(ipe, 2), "    Heading: ",
-                  round(averageHeadingError, 2), "    Entropy: ", entropyResult)
-
-            if useManualForAllFlag:
-                print("Day #", "Trial #", "Name", "Date", "Trial", "Strategy Type", "ipe", "velocity", "totalDistance",
-                      "distanceAverage", "averageHeadingError", "percentTraversed", "latency", "corridorAverage")
-                print(dayNum, trialNum[animal], aTrial.name, aTrial.date, aTrial.trial, strategyType, round(ipe, 2),
-                      round(velocity, 2), round(totalDistance, 2), round(distanceAverage, 2),
-                      round(averageHeadingError, 2), round(percentTraversed, 2), round(latency, 2),
-                      round(corridorAverage, 2))
-                plotName = "Strategy " + str(strategyType) + " Animal " + str(animal) + "  Day " + str(
-                    dayNum) + " Trial " + str(trialNum[animal])
-                self.plotPoints(arrayX, arrayY, float(mazeDiamVar), float(mazeCentreX), float(mazeCentreY),
-                                float(goalX), float(goalY), plotName,
-                                ("Animal: " + str(animal) + "  Day/Trial: " + str(dayNum) + "/" + str(
-                                    trialNum[animal])), float(goalDiamVar))  # ask user for answer
-                root.wait_window(self.top2)  # we wait until the user responds
-                strategyManual = searchStrategyV  # update the strategyType to that of the user
-
-            dataToWrite = []
-
-            dataToWrite.append(trialNum[animal])
-            #if aExperiment.hasTrialNames:
-            if hasattr(aTrial, 'name'):
-                dataToWrite.append(aTrial.name)
-            elif aExperiment.hasAnimalNames:
-                dataToWrite.append(aTrial.animal)
-            else:
-                dataToWrite.append('')
-
-            dataToWrite.extend(
-                [(str(animal) + " " + str(dayNum) + " " + str(trialNum[animal])), strategyType, round(ipe, 2),
-                 round(velocity, 2), round(totalDistance, 2), round(distanceAverage, 2),
-                 round(averageHeadingError, 2), round(percentTraversed, 2), round(latency, 2), score,
-                 initialHeadingError, round(entropyResult, 2), round(averageDistanceToSwimPathCentroid, 2),
-                 round(averageDistanceToCentre, 2), round(corridorAverage, 2), round(annulusCounter / i, 2),
-                 round(smallThigmoCounter / i, 2), round(fullThigmoCounter / i, 2), str(strategyManual)])
-            writer.writerow(dataToWrite)  # writing to csv file
-
-            f.flush()
-
-        print("Direct Path: ", directPathCount, "| Directed Search: ", directSearchCount, "| Focal Search: ",
-              focalSearchCount, "| Indirect Search: ", indirectSearchCount, "| Semi-focal Search: ",
-              semiFocalSearchCount, "| Chaining: ", chainingCount, "| Scanning: ", scanningCount, "| Random Search: ",
-              randomCount, "| Thigmotaxis: ", thigmotaxisCount, "| Not Recognized: ", notRecognizedCount)
-        try:
-            open_file(currentOutputFile)
-        except:
-            print("The system couldn't find ", currentOutputFile, " please check your output folder.")
+
+                dataToWrite = []
+
+                dataToWrite.append(trialNum[animal])
+                #if aExperiment.hasTrialNames:
+                if hasattr(aTrial, 'name'):
+                    dataToWrite.append(aTrial.name)
+                elif aExperiment.hasAnimalNames:
+                    dataToWrite.append(aTrial.animal)
+                else:
+                    dataToWrite.append('')
+
+                dataToWrite.extend(
+                    [(str(animal) + " " + str(dayNum) + " " + str(trialNum[animal])), strategyType, round(ipe, 2),
+                     round(velocity, 2), round(totalDistance, 2), round(distanceAverage, 2),
+                     round(averageHeadingError, 2), round(percentTraversed, 2), round(latency, 2), score,
+                     initialHeadingError, round(entropyResult, 2), round(averageDistanceToSwimPathCentroid, 2),
+                     round(averageDistanceToCentre, 2), round(corridorAverage, 2), round(annulusCounter / i, 2),
+                     round(smallThigmoCounter / i, 2), round(fullThigmoCounter / i, 2), str(strategyManual)])
+                writer.writerow(dataToWrite)  # writing to csv file
+
+                f.flush()
+
+            f.close()
+            print(" | ".join(name + ": " + str(count) for name, count in strategyCounts.items()))
+            try:
+                open_file(currentOutputFile)
+            except:
+                print("The system couldn't find ", currentOutputFile, " please check your output folder.")
 
         self.updateTasks()
         theStatus.set('')
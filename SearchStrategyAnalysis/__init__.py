@@ -1,2 +1,10 @@
-from SearchStrategyAnalysis.appTrial import Trial, Experiment, Parameters, saveFileAsExperiment, Datapoint
+from SearchStrategyAnalysis.appTrial import Trial, Experiment, Parameters, saveFileAsExperiment, Datapoint, \
+    saveExperimentArchive, loadExperimentArchive
 from SearchStrategyAnalysis.heatmap import guiHeatmap, heatmap
+from SearchStrategyAnalysis.searchMetrics import trialMetrics, experimentMetrics, idealPathError
+from SearchStrategyAnalysis.classifier import classifyStrategies, strategyMasks
+from SearchStrategyAnalysis.parameterSweep import parameterGrid, randomParameters, sweepParameters
+from SearchStrategyAnalysis.thresholdFit import fitThresholds, readManualLabels, confusionMatrix
+from SearchStrategyAnalysis.goalSweep import goalSweepMaps
+from SearchStrategyAnalysis.lazyMetrics import LazyMetrics, classifyLazily
+from SearchStrategyAnalysis.autoLocation import LocationEstimator, estimateLocations
@@ -10,12 +10,20 @@ import logging
 import os
 import fnmatch
 import datetime
+import json
+import pickle
+import hashlib
+import itertools
+import multiprocessing
+import concurrent.futures
+import concurrent.futures.process
 import tkinter
 from operator import add
 from collections import defaultdict
 import pkg_resources
 #pkg_resources.require("xlrd==1.2.0")
 import pandas as pd
+import numpy as np
 
 #from xlrd import open_workbook
 if sys.version_info<(3,0,0):  # tkinter names for python 2
@@ -54,52 +62,146 @@ class Datapoint(object):
 
 class Trial(object):  # an object for our row values
     def __init__(self):
-        self.datapointList = []
+        self._t = np.empty(0)  # samples are held in contiguous time, x and y columns
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._size = 0  # number of samples in use, the columns may hold spare capacity
         self.name = None
         self.animal = None
         self.date = None
         self.day = None
         self.trial = None
         self.corruptedData = False
+        self._store = None  # the Experiment whose packed columns this trial is a view on, if any
+
+    @property
+    def t(self):
+        return self._t[:self._size]
+
+    @property
+    def x(self):
+        return self._x[:self._size]
+
+    @property
+    def y(self):
+        return self._y[:self._size]
+
+    @property
+    def datapointList(self):  # kept for old callers, builds the Datapoint objects on demand
+        return list(self)
 
     def setname(self, name):
         self.name = name
+        self._metadataChanged()
 
     def setanimal(self, animal):
         self.animal = animal
+        self._metadataChanged()
 
     def setdate(self, date):
         self.date = date
+        self._metadataChanged()
 
     def settrial(self, trial):
         self.trial = trial
+        self._metadataChanged()
 
     def setday(self, day):
         self.day = day
+        self._metadataChanged()
 
     def markDataAsCorrupted(self):
         self.corruptedData = True
+        self._metadataChanged()
+
+    def _changed(self):  # tells the owning experiment its packed columns are stale
+        if self._store is not None:
+            self._store._dirty = True
+
+    def _metadataChanged(self):  # tells the owning experiment only its metadata columns are stale, not the samples
+        if self._store is not None:
+            self._store._metadataDirty = True
+
+    def setData(self, t, x, y):  # replaces the samples with whole columns, no copy if already float arrays
+        t = np.ascontiguousarray(t, dtype=float)
+        x = np.ascontiguousarray(x, dtype=float)
+        y = np.ascontiguousarray(y, dtype=float)
+        if not (len(t) == len(x) == len(y)):
+            raise ValueError("time, x and y columns must be the same length")
+        self._t, self._x, self._y = t, x, y
+        self._size = len(t)
+        self._changed()
+
+    def extend(self, t, x, y):  # appends whole columns of samples
+        t = np.asarray(t, dtype=float)
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if not (len(t) == len(x) == len(y)):
+            raise ValueError("time, x and y columns must be the same length")
+        newSize = self._size + len(t)
+        self._reserve(newSize)
+        self._t[self._size:newSize] = t
+        self._x[self._size:newSize] = x
+        self._y[self._size:newSize] = y
+        self._size = newSize
+        self._changed()
+
+    def _reserve(self, capacity):  # grows the columns geometrically so appends stay amortized O(1)
+        if capacity <= len(self._t):
+            return
+        capacity = max(capacity, 2 * len(self._t), 16)
+        for name in ("_t", "_x", "_y"):
+            column = np.empty(capacity)
+            column[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, column)
 
     def __str__(self):
         return self.animal if self.animal != None else self.name
 
     def append(self, adatapoint):
-        self.datapointList.append(adatapoint)
+        self._reserve(self._size + 1)
+        self._t[self._size] = adatapoint.time
+        self._x[self._size] = adatapoint.x
+        self._y[self._size] = adatapoint.y
+        self._size += 1
+        self._changed()
+
+    def __len__(self):
+        return self._size
+
+    def __getstate__(self):  # pickle only the used samples and never the owning experiment
+        state = self.__dict__.copy()
+        state["_t"], state["_x"], state["_y"] = self.t.copy(), self.x.copy(), self.y.copy()
+        state["_store"] = None
+        return state
 
     def __iter__(self):
-        return iter(self.datapointList)
+        return (Datapoint(time, x, y) for time, x, y in zip(self.t.tolist(), self.x.tolist(), self.y.tolist()))
 
 
 class Experiment(object):
+    # Trials are packed into one ragged struct-of-arrays store: the samples of every trial are concatenated into
+    # single t, x and y columns, offsets[i]:offsets[i + 1] is the span of trial i, and the per-trial metadata is
+    # held in parallel columns. After packing each Trial's columns are views on the store, so cohort-wide
+    # reductions run on the concatenated columns and per-trial slicing copies nothing.
     def __init__(self, name: str):
         self.name = name
         self.trialList = []
         self.hasAnimalNames = False
         self.hasDateInfo = False
         self.hasTrialNames = False
+        self._dirty = True
+        self._t = np.empty(0)
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._metadata = {}
+        self._metadataDirty = True
+        self._archiveKey = None
 
     def setTrialList(self, trialList):
         self.trialList = trialList
+        self._dirty = True
 
     def setHasAnimalNames(self, hasAnimalNames):
         self.hasAnimalNames = hasAnimalNames
@@ -112,6 +214,120 @@ class Experiment(object):
 
     def append(self, atrial):
         self.trialList.append(atrial)
+        self._dirty = True
+
+    def pack(self):  # concatenate every trial into the shared columns and rebind the trials as views on them
+        lengths = np.fromiter((len(aTrial) for aTrial in self.trialList), dtype=np.int64, count=len(self.trialList))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if len(self.trialList) > 0:
+            self._t = np.concatenate([aTrial.t for aTrial in self.trialList])
+            self._x = np.concatenate([aTrial.x for aTrial in self.trialList])
+            self._y = np.concatenate([aTrial.y for aTrial in self.trialList])
+        else:
+            self._t, self._x, self._y = np.empty(0), np.empty(0), np.empty(0)
+        self._offsets = offsets
+        self._archiveKey = None
+
+        self._bindTrials()
+
+    def setColumns(self, t, x, y, offsets, trialList, archiveKey=None):  # adopts already packed (e.g. memory-mapped) columns without copying
+        self._t, self._x, self._y = t, x, y
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self.trialList = trialList
+        self._bindTrials()
+        self._archiveKey = archiveKey
+
+    def _bindTrials(self):  # makes each trial a view on the packed columns and rebuilds the metadata columns
+        offsets = self._offsets
+        for index, aTrial in enumerate(self.trialList):
+            start, stop = offsets[index], offsets[index + 1]
+            aTrial._store = None
+            aTrial.setData(self._t[start:stop], self._x[start:stop], self._y[start:stop])
+            aTrial._store = self
+        self._buildMetadata()
+        self._dirty = False
+
+    def _buildMetadata(self):  # rebuilds the per-trial metadata columns from the trials
+        self._metadata = {
+            "names": np.array([aTrial.name for aTrial in self.trialList], dtype=object),
+            "animals": np.array([aTrial.animal for aTrial in self.trialList], dtype=object),
+            "dates": np.array([aTrial.date for aTrial in self.trialList], dtype=object),
+            "days": np.array([aTrial.day for aTrial in self.trialList], dtype=object),
+            "trialNumbers": np.array([aTrial.trial for aTrial in self.trialList], dtype=object),
+            "corrupted": np.array([aTrial.corruptedData for aTrial in self.trialList], dtype=bool),
+        }
+        self._metadataDirty = False
+
+    def _packed(self):
+        if self._dirty or len(self._offsets) != len(self.trialList) + 1:
+            self.pack()
+        return self
+
+    def _metadataColumns(self):  # the metadata columns, rebuilt after a trial's metadata changed without repacking
+        self._packed()
+        if self._metadataDirty:
+            self._buildMetadata()
+        return self._metadata
+
+    @property
+    def t(self):
+        return self._packed()._t
+
+    @property
+    def x(self):
+        return self._packed()._x
+
+    @property
+    def y(self):
+        return self._packed()._y
+
+    @property
+    def offsets(self):
+        return self._packed()._offsets
+
+    @property
+    def archiveKey(self):  # the archiveFingerprint of the read-only archive the samples come from, None once changed
+        return self._packed()._archiveKey
+
+    @property
+    def lengths(self):  # number of samples in each trial
+        return np.diff(self.offsets)
+
+    @property
+    def trialIndex(self):  # the trial each sample of the concatenated columns belongs to
+        return np.repeat(np.arange(len(self.trialList)), self.lengths)
+
+    @property
+    def names(self):
+        return self._metadataColumns()["names"]
+
+    @property
+    def animals(self):
+        return self._metadataColumns()["animals"]
+
+    @property
+    def dates(self):
+        return self._metadataColumns()["dates"]
+
+    @property
+    def days(self):
+        return self._metadataColumns()["days"]
+
+    @property
+    def trialNumbers(self):
+        return self._metadataColumns()["trialNumbers"]
+
+    @property
+    def corrupted(self):
+        return self._metadataColumns()["corrupted"]
+
+    def trialSlice(self, index):  # the span of one trial in the concatenated columns
+        offsets = self.offsets
+        return slice(int(offsets[index]), int(offsets[index + 1]))
+
+    def __getitem__(self, index):
+        return self.trialList[index]
 
     def __str__(self):
         return self.name
@@ -165,6 +381,35 @@ class Parameters:
     def __str__(self):
         return self.name
 
+
+# Parameters fields in the order they are stored in a parameter file (customobjs.pickle)
+parameterFields = ["ipeMaxVal", "headingMaxVal", "distanceToSwimMaxVal", "distanceToPlatMaxVal", "distanceToSwimMaxVal2",
+                   "distanceToPlatMaxVal2", "corridorAverageMinVal", "directedSearchMaxDistance", "focalMinDistance",
+                   "focalMaxDistance", "semiFocalMinDistance", "semiFocalMaxDistance", "corridoripeMaxVal",
+                   "annulusCounterMaxVal", "quadrantTotalMaxVal", "chainingMaxCoverage", "percentTraversedMaxVal",
+                   "percentTraversedMinVal", "distanceToCentreMaxVal", "thigmoMinDistance", "smallThigmoMinVal",
+                   "fullThigmoMinVal", "ipeIndirectMaxVal", "percentTraversedRandomMaxVal", "headingIndirectMaxVal",
+                   "useDirect", "useFocal", "useDirected", "useIndirect", "useSemiFocal", "useChaining", "useScanning",
+                   "useRandom", "useThigmotaxis"]
+
+
+def writeParameterFile(params, filename="customobjs.pickle"):  # saves the thresholds and enabled strategies of params
+    with open(filename, 'wb') as f:
+        pickle.dump([getattr(params, field) for field in parameterFields], f)
+
+
+def readParameterFile(filename="customobjs.pickle", name="Custom"):  # reads back Parameters saved by writeParameterFile
+    with open(filename, 'rb') as f:
+        settings = dict(zip(parameterFields, pickle.load(f)))
+    for field in parameterFields:
+        if field == "quadrantTotalMaxVal":
+            settings[field] = int(settings[field])
+        elif not field.startswith("use"):
+            settings[field] = float(settings[field])
+    settings["useThigmogaxis"] = settings.pop("useThigmotaxis")
+    return Parameters(name=name, **settings)
+
+
 def find_files(directory, pattern):  # searches for our files in the directory
         logging.debug("Finding files in the directory")
         for root, dirs, files in os.walk(directory):
@@ -181,6 +426,11 @@ def openFile():  # opens a dialog to get a single file
 global customxyt
 customxyt = []
 
+ezTrackChunkSize = 100000  # rows read at a time from ezTrack exports
+readerVersion = 1  # bump whenever the readers change what they produce, it invalidates cached trials
+archiveVersion = 1  # layout of the directories written by saveExperimentArchive
+cacheSizeLimit = 1 << 30  # bytes of .npz files kept in a cache directory, the least recently used go first
+
 
 def defineOwnSoftware(root, filename):
     file_extension = os.path.splitext(filename)[1]
@@ -286,11 +536,416 @@ def defineOwnSoftware(root, filename):
             messagebox.showinfo(None, "Error opening Excel table.")
 
 
-def saveFileAsExperiment(software, filename, filedirectory):
+def readEthovisionFile(filename):  # reads one Ethovision export into a list holding its trial
+    try:
+        sheet = pd.read_excel(filename, header = None)
+        logging.debug("Opened" + filename)
+    except Exception:
+        traceback.print_exc()
+        logging.error("Unable to open excel file " + filename)
+        return None
+
+    headerLines = int(sheet.iloc[0,1])  # gets number of header lines in the spreadsheet
+    aTrial = Trial()
+
+    header = sheet.iloc[1:headerLines, :2]  # parse the header block once, keyed on the upper-cased labels
+    headerValues = dict(zip(header.iloc[:, 0].astype(str).str.upper(), header.iloc[:, 1]))
+    if 'TRIAL NAME' in headerValues:
+        aTrial.setname(headerValues['TRIAL NAME'])
+    if 'ANIMAL ID' in headerValues:
+        aTrial.setanimal(headerValues['ANIMAL ID'])
+    if 'TRIAL' in headerValues:
+        aTrial.settrial(headerValues['TRIAL'])
+
+    data = sheet.iloc[headerLines:, 1:4]  # time, x and y as whole columns, missing values ("-") become NaN
+    time = pd.to_numeric(data.iloc[:, 0], errors='coerce').to_numpy(dtype=float)
+    x = pd.to_numeric(data.iloc[:, 1], errors='coerce').to_numpy(dtype=float)
+    y = pd.to_numeric(data.iloc[:, 2], errors='coerce').to_numpy(dtype=float)
+
+    valid = ~(np.isnan(time) | np.isnan(x) | np.isnan(y))
+    if not valid.all():
+        aTrial.markDataAsCorrupted()
+    aTrial.setData(time[valid], x[valid], y[valid])
+    return [aTrial]
+
+
+def parseTimeColumn(values):  # converts HH:MM:SS, MM:SS and plain second values to seconds in one pass, NaN if unreadable
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    text = values.astype(str).str.strip()
+    colons = text.str.count(':').to_numpy()
+    parts = text.str.split(':', expand=True).reindex(columns=range(3))
+    first = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)
+    second = pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=float)
+    third = pd.to_numeric(parts[2], errors='coerce').to_numpy(dtype=float)
+    return np.select([colons == 0, colons == 1, colons == 2],
+                     [first, first * 60 + second, first * 3600 + second * 60 + third], np.nan)
+
+
+def readAnymazeFile(filename, dialect):  # reads one AnyMaze export into a list holding its trial
+    try:
+        # the time, x and y columns as strings, the first data row has always been skipped along with the header
+        data = pd.read_csv(filename, sep=dialect.delimiter, quotechar=dialect.quotechar, header=None, skiprows=2,
+                           usecols=[0, 1, 2], dtype=str, keep_default_na=False)
+        logging.debug("Opened " + filename)
+    except Exception:
+        traceback.print_exc()
+        logging.info("Could not open " + filename)
+        return None
+
+    aTrial = Trial()
+    aTrial.setname(filename.split("/")[-1])
+
+    time = parseTimeColumn(data[0])
+    x = pd.to_numeric(data[1], errors='coerce').to_numpy(dtype=float)
+    y = pd.to_numeric(data[2], errors='coerce').to_numpy(dtype=float)
+
+    valid = ~(np.isnan(time) | np.isnan(x) | np.isnan(y))
+    if not valid.all():
+        aTrial.markDataAsCorrupted()
+    aTrial.setData(time[valid], x[valid], y[valid])
+    return [aTrial]
+
+
+def readWatermazeFile(filename, dialect):  # reads one Watermaze export, which holds many trials side by side
+    try:
+        sheet = pd.read_csv(filename, sep=dialect.delimiter, quotechar=dialect.quotechar, header=None, dtype=str,
+                            keep_default_na=False).to_numpy(dtype=object)
+    except Exception:
+        logging.info("Could not open " + filename)
+        return None
+
+    trials = []
+    for i in range(sheet.shape[1] // 3):  # every trial is an (x, y, t) triple of columns
+        header = sheet[0, i * 3:i * 3 + 3]  # animal, date and time of the trial
+        block = sheet[2:, i * 3:i * 3 + 3]
+
+        aTrial = Trial()
+        aTrial.setanimal(header[0])
+        try:
+            aTrial.setdate(datetime.datetime.strptime(header[1] + " " + header[2], "%m/%d/%Y %H:%M %p"))
+        except Exception as e:
+            aTrial.setdate(0)
+            print(e)
+
+        empty = (block == "").all(axis=1)  # the trial ends at its first empty row
+        if empty.any():
+            block = block[:np.argmax(empty)]
+
+        x = pd.to_numeric(block[:, 0], errors='coerce').astype(float)
+        y = pd.to_numeric(block[:, 1], errors='coerce').astype(float)
+        time = pd.to_numeric(block[:, 2], errors='coerce').astype(float)
+
+        valid = ~(np.isnan(time) | np.isnan(x) | np.isnan(y))
+        if not valid.all():
+            aTrial.markDataAsCorrupted()
+        aTrial.setData(time[valid], x[valid], y[valid])
+
+        if len(aTrial) > 0:
+            trials.append(aTrial)
+    return trials
+
+
+def readEztrackFile(filename, dialect, chunkSize=None):  # streams one ezTrack export into a list holding its trial
+    if chunkSize is None:
+        chunkSize = ezTrackChunkSize
+    aTrial = Trial()
+    aTrial.setname(filename.split("/")[-1])
+    try:
+        # only the columns we need, a fixed number of rows at a time so memory stays bounded on huge sessions
+        chunks = pd.read_csv(filename, sep=dialect.delimiter, quotechar=dialect.quotechar,
+                             usecols=["FPS", "Frame", "X", "Y"], chunksize=chunkSize)
+        for chunk in chunks:
+            fps = pd.to_numeric(chunk["FPS"], errors='coerce').to_numpy(dtype=float)
+            frame = pd.to_numeric(chunk["Frame"], errors='coerce').to_numpy(dtype=float)
+            x = pd.to_numeric(chunk["X"], errors='coerce').to_numpy(dtype=float)
+            y = pd.to_numeric(chunk["Y"], errors='coerce').to_numpy(dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                time = frame / fps
+
+            valid = np.isfinite(time) & ~(np.isnan(x) | np.isnan(y))
+            if not valid.all():
+                aTrial.markDataAsCorrupted()
+            aTrial.extend(time[valid], x[valid], y[valid])
+    except Exception:
+        traceback.print_exc()
+        logging.info("Could not open " + filename)
+        return None
+    return [aTrial]
+
+
+def readCustomFile(filename, xyt=None):  # reads one file in the user defined format (see defineOwnSoftware)
+    if xyt is None:
+        xyt = customxyt
+    xCol = xyt[0][0]
+    yCol = xyt[1][0]
+    tCol = xyt[2][0]
+    dataStartRow = xyt[0][1]
+    columns = sorted(set([xCol, yCol, tCol]))  # only the three chosen columns are parsed
+
+    file_extension = os.path.splitext(filename)[1]
+    try:
+        if (file_extension == '.csv'):
+            try:  # sniff the delimiter from the first data row so the fast C parser can be used
+                with open(filename, newline="") as file:
+                    for _ in range(dataStartRow):
+                        file.readline()
+                    delimiter = csv.Sniffer().sniff(file.readline(), delimiters=";,").delimiter
+                data = pd.read_csv(filename, sep=delimiter, header=None, skiprows=dataStartRow, usecols=columns,
+                                   dtype=str, engine='c')
+            except (csv.Error, pd.errors.ParserError):
+                data = pd.read_csv(filename, sep=";|,", header=None, skiprows=dataStartRow, usecols=columns,
+                                   dtype=str, engine='python')
+        elif (file_extension == '.xlsx'):
+            data = pd.read_excel(filename, header=None, skiprows=dataStartRow, usecols=columns)
+        else:
+            logging.info("Unsupported file type " + filename)
+            return None
+    except Exception:
+        traceback.print_exc()
+        logging.info("Could not open " + filename)
+        return None
+
+    aTrial = Trial()
+    aTrial.setname(filename.split("/")[-1])
+
+    x = pd.to_numeric(data[xCol], errors='coerce').to_numpy(dtype=float)
+    y = pd.to_numeric(data[yCol], errors='coerce').to_numpy(dtype=float)
+    time = parseTimeColumn(data[tCol])
+
+    missing = data[xCol].isna().to_numpy() | data[yCol].isna().to_numpy()  # empty positions are skipped quietly
+    valid = ~(np.isnan(time) | np.isnan(x) | np.isnan(y))
+    if (~valid & ~missing).any():
+        aTrial.markDataAsCorrupted()
+    aTrial.setData(time[valid], x[valid], y[valid])
+    return [aTrial]
+
+
+softwareInfo = {  # hasAnimalNames, hasDateInfo, hasTrialNames for each supported software
+    "ethovision": (True, False, True),
+    "anymaze": (False, False, True),
+    "watermaze": (True, True, False),
+    "eztrack": (False, False, True),
+    "custom": (False, False, False),
+}
+
+
+def _encodeValue(value):  # metadata values as JSON, dates are tagged so they come back as datetimes
+    if isinstance(value, datetime.datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError("Cannot store metadata of type " + type(value).__name__)
+
+
+def _decodeValue(value):
+    if isinstance(value, dict) and "datetime" in value:
+        return datetime.datetime.fromisoformat(value["datetime"])
+    return value
+
+
+def encodeTrialMetadata(trials):  # the per-trial metadata of a list of trials as a JSON string
+    return json.dumps([{"name": _encodeValue(aTrial.name), "animal": _encodeValue(aTrial.animal),
+                        "date": _encodeValue(aTrial.date), "day": _encodeValue(aTrial.day),
+                        "trial": _encodeValue(aTrial.trial), "corrupted": bool(aTrial.corruptedData)}
+                       for aTrial in trials])
+
+
+def applyTrialMetadata(aTrial, metadata):  # sets one decoded entry of encodeTrialMetadata on a trial
+    aTrial.setname(_decodeValue(metadata["name"]))
+    aTrial.setanimal(_decodeValue(metadata["animal"]))
+    aTrial.setdate(_decodeValue(metadata["date"]))
+    aTrial.setday(_decodeValue(metadata["day"]))
+    aTrial.settrial(_decodeValue(metadata["trial"]))
+    if metadata["corrupted"]:
+        aTrial.markDataAsCorrupted()
+
+
+def fileFingerprint(software, filename, xyt=None):  # identifies a parse of a file: path, size, mtime, software and reader
+    stat = os.stat(filename)
+    key = [os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, software, readerVersion]
+    if software == "custom":
+        key.append([list(coord) for coord in xyt])
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def archiveFingerprint(directory):  # identifies an archive's samples: path, size and mtime of its columns and version
+    key = [os.path.abspath(directory), archiveVersion]
+    for column in ("t", "x", "y", "offsets"):
+        stat = os.stat(os.path.join(directory, column + ".npy"))
+        key.append([stat.st_size, stat.st_mtime_ns])
+    return "archive-" + hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def saveCachedTrials(path, trials):  # writes parsed trials to an .npz file, atomically so parallel loads never clash
+    metadata = encodeTrialMetadata(trials)  # raises TypeError before anything is written if it can't be stored
+    lengths = [len(aTrial) for aTrial in trials]
+    offsets = np.zeros(len(trials) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    tempPath = path + "." + str(os.getpid()) + ".tmp"
+    with open(tempPath, "wb") as file:
+        np.savez(file,
+                 t=np.concatenate([aTrial.t for aTrial in trials]) if trials else np.empty(0),
+                 x=np.concatenate([aTrial.x for aTrial in trials]) if trials else np.empty(0),
+                 y=np.concatenate([aTrial.y for aTrial in trials]) if trials else np.empty(0),
+                 offsets=offsets, metadata=np.array(metadata))
+    os.replace(tempPath, path)
+
+
+def loadCachedTrials(path):  # reads back the trials written by saveCachedTrials
+    with np.load(path, allow_pickle=False) as cached:
+        t, x, y, offsets = cached["t"], cached["x"], cached["y"], cached["offsets"]
+        metadata = json.loads(str(cached["metadata"]))
+    os.utime(path)  # marks it used for pruneCache
+    trials = []
+    for index, entry in enumerate(metadata):
+        aTrial = Trial()
+        aTrial.setData(t[offsets[index]:offsets[index + 1]], x[offsets[index]:offsets[index + 1]],
+                       y[offsets[index]:offsets[index + 1]])
+        applyTrialMetadata(aTrial, entry)
+        trials.append(aTrial)
+    return trials
+
+
+def pruneCache(cacheDirectory, sizeLimit=cacheSizeLimit):  # deletes the least recently used .npz files over sizeLimit
+    # Cache hits refresh a file's mtime, so the oldest files are the least recently used. sizeLimit=0 clears the cache.
+    try:
+        entries = [entry for entry in os.scandir(cacheDirectory) if entry.is_file() and entry.name.endswith(".npz")]
+        entries = [(entry.stat().st_mtime_ns, entry.stat().st_size, entry.path) for entry in entries]
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= sizeLimit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:  # already removed by another run
+            pass
+
+
+def saveExperimentArchive(experiment, directory):  # writes a whole experiment to an archive directory
+    # The packed t, x, y and offsets columns are stored as plain .npy files so loadExperimentArchive can
+    # memory-map them, the experiment and trial metadata go in a JSON table next to them.
+    metadata = {"version": archiveVersion, "name": _encodeValue(experiment.name),
+                "hasAnimalNames": experiment.hasAnimalNames, "hasDateInfo": experiment.hasDateInfo,
+                "hasTrialNames": experiment.hasTrialNames,
+                "trials": json.loads(encodeTrialMetadata(experiment.trialList))}
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "t.npy"), experiment.t)
+    np.save(os.path.join(directory, "x.npy"), experiment.x)
+    np.save(os.path.join(directory, "y.npy"), experiment.y)
+    np.save(os.path.join(directory, "offsets.npy"), experiment.offsets)
+    with open(os.path.join(directory, "metadata.json"), "w") as file:
+        json.dump(metadata, file)
+    logging.info("Saved experiment archive " + directory)
+
+
+def loadExperimentArchive(directory, mmap=True):  # opens an archive written by saveExperimentArchive
+    # With mmap the columns are memory-mapped read only, nothing is read until a trial's samples are used, and the
+    # experiment's archiveKey identifies them so metric caches never need to hash the samples.
+    with open(os.path.join(directory, "metadata.json")) as file:
+        metadata = json.load(file)
+    if metadata.get("version") != archiveVersion:
+        logging.error("Unsupported archive version in " + directory)
+        return None
+    mode = 'r' if mmap else None
+    t = np.load(os.path.join(directory, "t.npy"), mmap_mode=mode)
+    x = np.load(os.path.join(directory, "x.npy"), mmap_mode=mode)
+    y = np.load(os.path.join(directory, "y.npy"), mmap_mode=mode)
+    offsets = np.load(os.path.join(directory, "offsets.npy"))
+
+    experiment = Experiment(_decodeValue(metadata["name"]))
+    experiment.setHasAnimalNames(metadata["hasAnimalNames"])
+    experiment.setHasDateInfo(metadata["hasDateInfo"])
+    experiment.setHasTrialNames(metadata["hasTrialNames"])
+    trialList = []
+    for entry in metadata["trials"]:
+        aTrial = Trial()
+        applyTrialMetadata(aTrial, entry)
+        trialList.append(aTrial)
+    experiment.setColumns(t, x, y, offsets, trialList, archiveFingerprint(directory) if mmap else None)
+    logging.info("Opened experiment archive " + directory)
+    return experiment
+
+
+def readTrialFile(software, filename, xyt=None, cacheDirectory=None):  # parses one file into a list of trials, None if it can't be read
+    if xyt is None:
+        xyt = customxyt
+    if cacheDirectory is not None:  # unchanged files are served from the cache without parsing
+        try:
+            cachePath = os.path.join(cacheDirectory, fileFingerprint(software, filename, xyt) + ".npz")
+        except OSError:
+            cachePath = None
+        if cachePath is not None and os.path.exists(cachePath):
+            try:
+                return loadCachedTrials(cachePath)
+            except Exception:
+                logging.info("Could not read cached trials for " + filename + ", parsing again")
+        trials = readTrialFile(software, filename, xyt)
+        if cachePath is not None and trials is not None:
+            try:
+                os.makedirs(cacheDirectory, exist_ok=True)
+                saveCachedTrials(cachePath, trials)
+            except TypeError as error:  # metadata JSON cannot hold exactly is left uncached rather than changed
+                logging.info("Not caching trials for " + filename + ": " + str(error))
+            except Exception:
+                logging.info("Could not cache trials for " + filename)
+        return trials
+
+    dialect = ""
+    file_extension = os.path.splitext(filename)[1]
+    if software != "ethovision" and file_extension == '.csv':
+        with open(filename, newline="") as file:
+            dialect = csv.Sniffer().sniff(file.readline())
+    if software == "ethovision":
+        logging.info("Reading file ethovision")
+        return readEthovisionFile(filename)
+    elif software == "anymaze":
+        logging.info("Reading anymaze")
+        return readAnymazeFile(filename, dialect)
+    elif software == "watermaze":
+        logging.info("Reading watermaze")
+        return readWatermazeFile(filename, dialect)
+    elif software == "eztrack":
+        logging.info("Reading file ezTrack")
+        return readEztrackFile(filename, dialect)
+    elif software == "custom":
+        logging.info("Reading file custom")
+        return readCustomFile(filename, xyt)
+    logging.critical("Could not determine trial, saveFileAsTrial")
+    return None
+
+
+def _poolContext():  # forked workers inherit the loaded modules instead of re-running the GUI start up
+    if _platform == "darwin":  # forking after Tk and matplotlib have started can crash or hang on macOS
+        return multiprocessing.get_context("spawn")
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def readTrialFilesParallel(software, filenameList, workers, cacheDirectory=None):  # parses the files in a process pool, in file order
+    chunksize = max(1, len(filenameList) // (workers * 4))
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=_poolContext()) as executor:
+            return list(executor.map(readTrialFile, itertools.repeat(software), filenameList,
+                                     itertools.repeat(list(customxyt)), itertools.repeat(cacheDirectory),
+                                     chunksize=chunksize))
+    except (OSError, pickle.PicklingError, concurrent.futures.process.BrokenProcessPool):  # the pool itself failed,
+        traceback.print_exc()  # errors parsing a file are raised as they are when loading serially
+        logging.warning("Parallel loading failed, reading the files one at a time")
+        return None
+
+
+def saveFileAsExperiment(software, filename, filedirectory, workers=1, cacheDirectory=None):
     trialList = []
     filenameList = []
     experiment = Experiment(filename)
-    dialect = ""
     if filename == "":
         if filedirectory == "":
             logging.error("No files selected")
@@ -306,250 +961,29 @@ def saveFileAsExperiment(software, filename, filedirectory):
     else:
         filenameList.append(filename)
 
-    for filename in filenameList:
-        file_extension = os.path.splitext(filename)[1]
-        if software != "ethovision" and file_extension == '.csv':
-            with open(filename, newline="") as file:
-                dialect = csv.Sniffer().sniff(file.readline())
-                file.seek(0)
-        if software == "ethovision":
-            logging.info("Reading file ethovision")
-            experiment.setHasAnimalNames(True)
-            experiment.setHasDateInfo(False)
-            experiment.setHasTrialNames(True)
-
-            try:
-                sheet = pd.read_excel(filename, header = None)
-                logging.debug("Opened" + filename)
-            except Exception:
-                traceback.print_exc()
-                logging.error("Unable to open excel file " + filename)
-                return
-
-            number_of_rows = len(sheet)
-            headerLines = int(sheet.iloc[0,1])  # gets number of header lines in the spreadsheet
-            aTrial = Trial()
-
-            for row in range(1, headerLines):
-                if str(sheet.iloc[row, 0]).upper() == 'TRIAL NAME':
-                    aTrial.setname(sheet.iloc[row,1])
-                elif str(sheet.iloc[row, 0]).upper() == 'ANIMAL ID':
-                    aTrial.setanimal(sheet.iloc[row,1])
-                elif str(sheet.iloc[row, 0]).upper() == 'TRIAL':
-                    aTrial.settrial(sheet.iloc[row,1])
-
-            for row in range(headerLines, number_of_rows):  # for each row
-                time = sheet.iloc[row,1]
-                x = sheet.iloc[row,2]
-                y = sheet.iloc[row,3]
-
-                if time == "NaN" or x == "NaN" or y == "NaN":
-                    aTrial.markDataAsCorrupted()
-                    continue
-
-                try:
-                    aTrial.append(Datapoint(float(time), float(x), float(y)))
-                except ValueError:
-                    aTrial.markDataAsCorrupted()
-                    pass
-
-            trialList.append(aTrial)
-
-        elif software == "anymaze":
-            logging.info("Reading anymaze")
-            experiment.setHasAnimalNames(False)
-            experiment.setHasDateInfo(False)
-            experiment.setHasTrialNames(True)
-
-            columns = defaultdict(list)  # each value in each column is appended to a list
-            try:
-                f = open(filename)
-                logging.debug("Opened " + filename)
-            except Exception:
-                traceback.print_exc()
-                logging.info("Could not open " + filename)
-                return
-            reader = csv.reader(f, dialect)
-            next(reader)
-            for row in reader:
-                for (i, v) in enumerate(row):
-                    columns[i].append(v)
-
-            aTrial = Trial()
-            aTrial.setname(filename.split("/")[-1])
-
-            for time, x, y in zip(columns[0][1:], columns[1][1:], columns[2][1:]):
-                print("TIME: ",time)
-                if (sum(map(lambda x : 1 if ':' in x else 0, time))>0):
-                    try:
-                        if (sum(map(lambda x : 1 if ':' in x else 0, time)) == 2):
-                            hours = float(time.split(':')[0])
-                            minutes = float(time.split(':')[1])
-                            seconds = float(time.split(':')[2])
-                        else:
-                            minutes = float(time.split(':')[0])
-                            seconds = float(time.split(':')[1])
-                            hours = 0
-                        time = seconds + minutes*60 + hours*3600
-                    except:
-                        aTrial.markDataAsCorrupted()
-                else:
-                    time = float(time)
- 
-                x = float(x)
-                y = float(y)
-                aTrial.append(Datapoint(time, x, y))
-                
-            trialList.append(aTrial)
-
-        elif software == "watermaze":  
-            logging.info("Reading watermaze")
-            experiment.setHasAnimalNames(True)
-            experiment.setHasDateInfo(True)
-            experiment.setHasTrialNames(False)
-
-            columns = defaultdict(list)  # each value in each column is appended to a list
-
-            number_of_columns = 0
-            try:
-                f = open(filename)
-            except:
-                logging.info("Could not open " + filename)
-                return
-
-            reader = csv.reader(f, dialect)
-            for row in reader:
-                for (i, v) in enumerate(row):
-                    columns[i].append(v)
-                    number_of_columns = i
-
-            for i in range(0, int(round((number_of_columns / 3)))):
-                col1 = columns[i * 3]
-                col2 = columns[1 + i * 3]
-                col3 = columns[2 + i * 3]
-
-                aTrial = Trial()
-                aTrial.setanimal(col1[0])
-                try:
-                    aTrial.setdate(datetime.datetime.strptime(col2[0] + " " + col3[0], "%m/%d/%Y %H:%M %p"))
-                except Exception as e:
-                    aTrial.setdate(0)
-                    print(e)
-
-                for xVal, yVal, timeVal in zip(col1[2:], col2[2:], col3[2:]):
-                    logging.debug("Running through columns: " + str(timeVal) + str(xVal) + str(yVal))
-                    values = []
-                    if timeVal == "" and xVal == "" and yVal == "":
-                        break
-                    elif timeVal == "NaN" or xVal == "NaN" or yVal == "NaN":
-                        aTrial.markDataAsCorrupted()
-                        continue
-                    else:
-                        try:
-                            aTrial.append(Datapoint(float(timeVal),float(xVal),float(yVal)))
-                        except ValueError:
-                            aTrial.markDataAsCorrupted()
-                            continue
-
-                if len(aTrial.datapointList) > 0:
-                    trialList.append(aTrial)
-
-        elif software == "eztrack":
-            logging.info("Reading file ezTrack")
-            experiment.setHasAnimalNames(False)
-            experiment.setHasDateInfo(False)
-            experiment.setHasTrialNames(True)
-            try:
-                f = open(filename)
-            except:
-                logging.info("Could not open " + filename)
-                return
-
-            reader = csv.reader(f, dialect)
-            listReader = list(reader)
-            aTrial = Trial()
-            aTrial.setname(filename.split("/")[-1])
-            columns = defaultdict(list)  # each value in each column is appended to a list
-            aIndex = 0
-            for aColumn in listReader[0]:
-                if aColumn == "FPS":
-                    fpsCol = aIndex
-                elif aColumn == "Frame":
-                    frameCol = aIndex
-                elif aColumn == "X":
-                    xCol = aIndex
-                elif aColumn == "Y":
-                    yCol = aIndex
-                aIndex = aIndex +1
-            for row in listReader:
-                for (i, v) in enumerate(row):
-                    columns[i].append(v)
-
-            for fps, frame, x, y in zip(columns[fpsCol][1:], columns[frameCol][1:], columns[xCol][1:], columns[yCol][1:]):
-                try:
-                    time = float(frame)/float(fps)
-                    x = float(x)
-                    y = float(y)
-                    print(time,x,y)
-                    aTrial.append(Datapoint(time, x, y))
-                except:
-                    aTrial.markDataAsCorrupted()
-
-            trialList.append(aTrial)
-
-        elif software == "custom":
-            logging.info("Reading file custom")
-            experiment.setHasAnimalNames(False)
-            experiment.setHasDateInfo(False)
-            experiment.setHasTrialNames(False)
-            try:
-                f = open(filename)
-            except:
-                logging.info("Could not open " + filename)
-                return
-
-            file_extension = os.path.splitext(filename)[1]
-            if (file_extension == '.csv'):
-                # reader = csv.reader(f, dialect)
-                reader = pd.read_csv(filename, sep=";|,", header=None, engine='python')
-            elif (file_extension == '.xlsx'):
-                reader = pd.read_excel(filename, header=None)
-
-
-            # listReader = list(reader)
-            aTrial = Trial()
-            aTrial.setname(filename.split("/")[-1])
-            aIndex = 0
-            xCol = customxyt[0][0]
-            yCol = customxyt[1][0]
-            tCol = customxyt[2][0]
-            dataStartRow = customxyt[0][1]
-            for index, row in reader.iloc[dataStartRow:].iterrows():
-                try:
-                    x = float(row[xCol])
-                    y = float(row[yCol])
-                    t = row[tCol]
-                    if isinstance(t, str) and t.count(':') == 2:
-                        hours = float(t.split(':')[0])
-                        minutes = float(t.split(':')[1])
-                        seconds = float(t.split(':')[2])
-                        time = seconds + minutes * 60 + hours * 3600
-                    elif isinstance(t, str) and t.count(':') == 1:
-                        minutes = float(t.split(':')[0])
-                        seconds = float(t.split(':')[1])
-                        time = seconds + minutes * 60
-                    else:
-                        time = float(t)
-                    # print(time, x, y)
-                    if not math.isnan(x) and not math.isnan(y):
-                        aTrial.append(Datapoint(time, x, y))
-                except:
-                    aTrial.markDataAsCorrupted()
-            trialList.append(aTrial)
-        else:
-            logging.critical("Could not determine trial, saveFileAsTrial")
+    if software not in softwareInfo:
+        logging.critical("Could not determine trial, saveFileAsTrial")
+        return
+    hasAnimalNames, hasDateInfo, hasTrialNames = softwareInfo[software]
+    experiment.setHasAnimalNames(hasAnimalNames)
+    experiment.setHasDateInfo(hasDateInfo)
+    experiment.setHasTrialNames(hasTrialNames)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = None
+    if workers > 1 and len(filenameList) > 1:
+        results = readTrialFilesParallel(software, filenameList, min(workers, len(filenameList)), cacheDirectory)
+    if results is None:  # serial loading, or the fallback when the pool could not be used
+        results = (readTrialFile(software, aFile, cacheDirectory=cacheDirectory) for aFile in filenameList)
+
+    for trials in results:  # merged back in file order so the output is the same however it was loaded
+        if trials is None:
             return
-    
+        trialList.extend(trials)
+    if cacheDirectory is not None:
+        pruneCache(cacheDirectory)
+
     if experiment.hasDateInfo:
         trialList.sort(key=lambda t:t.date)
     
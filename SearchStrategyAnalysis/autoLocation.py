@@ -0,0 +1,117 @@
+# Module: autoLocation.py
+# Estimates the maze centre and diameter and the goal position and size from the trials themselves
+
+import numpy as np
+
+try:  # Tries to import local dependencies (pypi install)
+    from SearchStrategyAnalysis.searchMetrics import _layout, trialChunks
+except:  # For local path
+    from searchMetrics import _layout, trialChunks
+
+extremeDirections = 16  # directions the cohort's extent is measured in for the circle fit, the first four are the axes
+estimatorChunkSamples = 1 << 22  # samples read at once by estimateLocations
+goalInlierScale = 2.5  # endpoints further than this many times their median distance from the goal are ignored
+
+
+def trialExtents(x, y, offsets):
+    """ The furthest each trial reaches in every one of extremeDirections and where it ends.
+
+    Returns the direction angles, a trials x extremeDirections array of the largest projection of the path on each
+    direction (the first four columns are maxX, maxY, -minX and -minY, the trial's bounding box) and the last x and y
+    of every trial. Empty trials are NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    lengths, starts, _ = _layout(offsets)
+    nonEmpty = lengths > 0
+    angles = np.arange(extremeDirections) * (2 * np.pi / extremeDirections)
+    angles = np.concatenate((angles[0::4], angles[1::4], angles[2::4], angles[3::4]))  # the axes first
+    extents = np.full((len(lengths), extremeDirections), np.nan)
+    endX = np.full(len(lengths), np.nan)
+    endY = np.full(len(lengths), np.nan)
+    if np.any(nonEmpty):
+        for direction, angle in enumerate(angles):  # one direction at a time so only one projection is held
+            projection = x * np.round(np.cos(angle), 12) + y * np.round(np.sin(angle), 12)
+            extents[nonEmpty, direction] = np.maximum.reduceat(projection, starts[nonEmpty])
+        ends = starts[nonEmpty] + lengths[nonEmpty] - 1
+        endX[nonEmpty] = x[ends]
+        endY[nonEmpty] = y[ends]
+    return angles, extents, endX, endY
+
+
+def fitCircle(angles, extents):
+    """ Least-squares centre and radius of the circle whose extent in each direction angle best matches extents.
+
+    A circle of centre (cx, cy) and radius r reaches cx cos(angle) + cy sin(angle) + r in direction angle, so the fit
+    is linear. Directions with no extent (NaN) are left out.
+    """
+    known = np.isfinite(extents)
+    system = np.column_stack((np.cos(angles), np.sin(angles), np.ones(len(angles))))[known]
+    (centreX, centreY, radius), _, _, _ = np.linalg.lstsq(system, extents[known], rcond=None)
+    return centreX, centreY, radius
+
+
+def endpointGoal(endX, endY, rounds=5):
+    """ The goal position and diameter estimated from where the trials end.
+
+    Trials that find the platform end on it, so the goal is taken as the densest cluster of endpoints: starting from
+    their median, endpoints further than goalInlierScale times the median distance are dropped and the mean of the
+    rest is taken, a few times over. A point spread evenly over a disc of radius a lies 2a/3 from its centre on
+    average, so the diameter is three times the inliers' mean distance. Returns NaNs when there are no endpoints.
+    """
+    known = np.isfinite(endX) & np.isfinite(endY)
+    endX, endY = endX[known], endY[known]
+    if len(endX) == 0:
+        return np.nan, np.nan, np.nan
+    goalX, goalY = np.median(endX), np.median(endY)
+    inliers = np.ones(len(endX), dtype=bool)
+    for fitRound in range(rounds):
+        distance = np.sqrt((endX - goalX) ** 2 + (endY - goalY) ** 2)
+        inliers = distance <= goalInlierScale * np.median(distance)
+        if not np.any(inliers):
+            break
+        goalX, goalY = endX[inliers].mean(), endY[inliers].mean()
+    distance = np.sqrt((endX[inliers] - goalX) ** 2 + (endY[inliers] - goalY) ** 2)
+    return goalX, goalY, 3 * distance.mean() if len(distance) else np.nan
+
+
+class LocationEstimator(object):
+    """ Streaming estimate of the maze and goal from batches of trials.
+
+    Call add with the packed columns of one or more whole trials at a time; only the cohort's extents and the trial
+    endpoints are kept, so the samples can be read a chunk at a time.
+    """
+
+    def __init__(self):
+        self.angles = None
+        self.extents = np.full(extremeDirections, np.nan)
+        self.endX = []
+        self.endY = []
+
+    def add(self, x, y, offsets):
+        self.angles, extents, endX, endY = trialExtents(x, y, offsets)
+        if len(extents):
+            self.extents = np.fmax(self.extents, np.fmax.reduce(extents, axis=0))
+        self.endX.append(endX)
+        self.endY.append(endY)
+
+    def trialCount(self):
+        return int(sum(np.count_nonzero(np.isfinite(endX)) for endX in self.endX))
+
+    def estimate(self):
+        """ The maze centre x and y, maze diameter, goal x and y and goal diameter, NaN where there is no data. """
+        if self.angles is None or not np.any(np.isfinite(self.extents)):
+            return np.nan, np.nan, np.nan, np.nan, np.nan, np.nan
+        centreX, centreY, radius = fitCircle(self.angles, self.extents)
+        goalX, goalY, goalDiam = endpointGoal(np.concatenate(self.endX), np.concatenate(self.endY))
+        return centreX, centreY, 2 * radius, goalX, goalY, goalDiam
+
+
+def estimateLocations(x, y, offsets):
+    """ LocationEstimator over packed columns, as stored by Experiment, reading about estimatorChunkSamples at once. """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    estimator = LocationEstimator()
+    for first, last in trialChunks(offsets, estimatorChunkSamples):
+        samples = slice(offsets[first], offsets[last])
+        estimator.add(x[samples], y[samples], offsets[first:last + 1] - offsets[first])
+    return estimator
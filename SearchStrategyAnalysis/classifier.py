@@ -0,0 +1,87 @@
+# Module: classifier.py
+# Assigns search strategies to a whole table of trial metrics at once
+
+import numpy as np
+
+strategyNames = ["Direct Path", "Focal Search", "Directed Search", "Indirect Search", "Semi-focal Search", "Chaining",
+                 "Scanning", "Thigmotaxis", "Random Search"]  # in the order the cascade tests them
+strategyScores = [3, 2, 2, 2, 2, 1, 1, 0, 0]
+notRecognized = "Not Recognized"
+
+
+def strategyCriteria(params, mazeRadius):
+    """ Whether each strategy in strategyNames is enabled and the conditions a trial must meet to get it.
+
+    Each condition takes a function returning a metric column by name and gives a boolean mask. The cheap path
+    metrics are tested first, so a lazy table can drop trials before the costlier metrics are asked for.
+    """
+    def fraction(m, counter):
+        return m(counter) / m("sampleCount")
+
+    return [
+        (params.useDirect, [lambda m: m("ipe") <= params.ipeMaxVal,
+                            lambda m: m("averageHeadingError") <= params.headingMaxVal]),
+        (params.useFocal, [lambda m: (m("totalDistance") < params.focalMaxDistance) &
+                           (m("totalDistance") > params.focalMinDistance),
+                           lambda m: m("averageDistanceToSwimPathCentroid") < (
+                               mazeRadius * params.distanceToSwimMaxVal / 100),
+                           lambda m: m("distanceAverage") < (params.distanceToPlatMaxVal / 100 * mazeRadius)]),
+        (params.useDirected, [lambda m: m("totalDistance") < params.directedSearchMaxDistance,
+                              lambda m: m("ipe") <= params.corridoripeMaxVal,
+                              lambda m: m("corridorAverage") >= params.corridorAverageMinVal / 100]),
+        (params.useIndirect, [lambda m: m("ipe") < params.ipeIndirectMaxVal,
+                              lambda m: m("averageHeadingError") < params.headingIndirectMaxVal]),
+        (params.useSemiFocal, [lambda m: (m("totalDistance") < params.semiFocalMaxDistance) &
+                               (m("totalDistance") > params.semiFocalMinDistance),
+                               lambda m: m("averageDistanceToSwimPathCentroid") < (
+                                   mazeRadius * params.distanceToSwimMaxVal2 / 100),
+                               lambda m: m("distanceAverage") < (params.distanceToPlatMaxVal2 / 100 * mazeRadius)]),
+        (params.useChaining, [lambda m: m("quadrantTotal") >= params.quadrantTotalMaxVal,
+                              lambda m: fraction(m, "annulusCounter") > params.annulusCounterMaxVal / 100,
+                              lambda m: m("percentTraversed") < params.chainingMaxCoverage]),
+        (params.useScanning, [lambda m: m("averageDistanceToCentre") <= (
+            params.distanceToCentreMaxVal / 100 * mazeRadius),
+                              lambda m: (params.percentTraversedMinVal <= m("percentTraversed")) &
+                              (params.percentTraversedMaxVal > m("percentTraversed"))]),
+        (params.useThigmotaxis, [lambda m: m("totalDistance") > params.thigmoMinDistance,
+                                 lambda m: fraction(m, "fullThigmoCounter") >= params.fullThigmoMinVal / 100,
+                                 lambda m: fraction(m, "smallThigmoCounter") >= params.smallThigmoMinVal / 100]),
+        (params.useRandom, [lambda m: m("percentTraversed") >= params.percentTraversedRandomMaxVal]),
+    ]
+
+
+def strategyMasks(metrics, params, mazeRadius):
+    """ One boolean mask per strategy in strategyNames, true for the trials that meet that strategy's criteria.
+
+    metrics is a DataFrame (or dict of arrays) with the experimentMetrics columns. A trial can meet several strategies,
+    classifyStrategies gives the first one priority.
+    """
+    columns = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = np.asarray(metrics[name], dtype=float)
+        return columns[name]
+
+    trialCount = len(column("sampleCount"))
+    masks = []
+    for enabled, conditions in strategyCriteria(params, mazeRadius):
+        mask = np.full(trialCount, bool(enabled))
+        if enabled:
+            for condition in conditions:
+                mask &= condition(column)
+        masks.append(mask)
+    return masks
+
+
+def classifyStrategies(metrics, params, mazeRadius):
+    """ Classifies every trial of a metric table with the strategy cascade of params.
+
+    Returns the strategy names and scores as arrays, one entry per trial, and a dict of how many trials got each
+    strategy, in cascade order with Not Recognized last.
+    """
+    masks = strategyMasks(metrics, params, mazeRadius)
+    strategies = np.select(masks, strategyNames, default=notRecognized)
+    scores = np.select(masks, strategyScores, default=0)
+    counts = {name: int(np.count_nonzero(strategies == name)) for name in strategyNames + [notRecognized]}
+    return strategies, scores, counts
@@ -0,0 +1,71 @@
+# Module: goalSweep.py
+# Maps of the goal-dependent metrics over a grid of candidate goal positions
+
+import numpy as np
+
+try:  # Tries to import local dependencies (pypi install)
+    from SearchStrategyAnalysis.searchMetrics import goalMetrics, pathLength, sampleRates, trialChunks
+except:  # For local path
+    from searchMetrics import goalMetrics, pathLength, sampleRates, trialChunks
+
+sweepChunkSamples = 1 << 20  # most samples evaluated against the goal grid at once, goalMetrics blocks the goals
+
+
+def candidateGoals(mazeCentreX, mazeCentreY, mazeRadius, gridSize=50, circular=True):
+    """ The centres of a gridSize x gridSize grid over the maze, and a mask of the ones inside a circular maze. """
+    centres = (np.arange(gridSize) + 0.5) * (2.0 * mazeRadius / gridSize) - mazeRadius
+    goalX, goalY = np.meshgrid(mazeCentreX + centres, mazeCentreY + centres, indexing="xy")
+    inside = np.ones(goalX.shape, dtype=bool)
+    if circular:
+        inside = (goalX - mazeCentreX) ** 2 + (goalY - mazeCentreY) ** 2 <= mazeRadius ** 2
+    return goalX, goalY, inside
+
+
+def goalSweepMaps(t, x, y, offsets, mazeCentreX, mazeCentreY, mazeRadius, corridorWidth, chainingRadius, goalDiam,
+                  gridSize=50, circular=True, groups=None, metrics=("ipe", "distanceAverage", "averageHeadingError"),
+                  blockSize=None):
+    """ The goal-dependent metrics of every trial evaluated for every goal of a grid over the maze.
+
+    Trials are taken whole, without truncation. Returns a dict with the candidate goalX and goalY positions
+    (gridSize x gridSize) and a map per metric in metrics: trials x gridSize x gridSize, or with groups (one label per
+    trial, e.g. the day or animal) the mean map of each group, in the order of the "groups" entry. Candidates outside
+    a circular maze are NaN. Trials are processed in chunks of about sweepChunkSamples samples and the goals in blocks
+    bounded by blockSize (see goalMetrics), so memory stays bounded.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    trialCount = len(offsets) - 1
+    goalX, goalY, inside = candidateGoals(mazeCentreX, mazeCentreY, mazeRadius, gridSize, circular)
+    candidateX, candidateY = goalX[inside], goalY[inside]
+
+    if groups is not None:
+        groupLabels, groupIndex = np.unique(np.asarray(groups), return_inverse=True)
+        rowCount = len(groupLabels)
+    else:
+        rowCount = trialCount
+    sums = {key: np.zeros((rowCount, len(candidateX))) for key in metrics}
+
+    for first, last in trialChunks(offsets, sweepChunkSamples):
+        chunkOffsets = offsets[first:last + 1] - offsets[first]
+        samples = slice(offsets[first], offsets[last])
+        _, _, velocity = pathLength(t[samples], x[samples], y[samples], chunkOffsets)
+        values = goalMetrics(t[samples], x[samples], y[samples], chunkOffsets, candidateX, candidateY, mazeCentreX,
+                             mazeCentreY, corridorWidth, chainingRadius, goalDiam, velocity,
+                             sampleRates(t[samples], chunkOffsets), keys=metrics, blockSize=blockSize)
+        for key in metrics:
+            if groups is not None:
+                np.add.at(sums[key], groupIndex[first:last], values[key])
+            else:
+                sums[key][first:last] = values[key]
+
+    maps = {"goalX": goalX, "goalY": goalY}
+    if groups is not None:
+        maps["groups"] = groupLabels
+        trialsPerGroup = np.bincount(groupIndex, minlength=rowCount)[:, None]
+    for key in metrics:
+        values = sums[key] / np.maximum(trialsPerGroup, 1) if groups is not None else sums[key]
+        maps[key] = np.full((rowCount, gridSize, gridSize), np.nan)
+        maps[key][:, inside] = values
+    return maps
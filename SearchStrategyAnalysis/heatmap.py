@@ -1,6 +1,7 @@
 import math
 import os
 import sys
+import numpy as np
 try:
     from SearchStrategyAnalysis.appTrial import Trial, Experiment, Parameters
 except:
@@ -55,23 +56,17 @@ def heatmap(self, experiment):
     yMax = 0.0
 
     for aTrial in experiment:  # for all the files we find
-        theStatus.set("Running " + aFile)
-        i = 0.0
-        for row in aTrial:
-            # Create data
-            if row.x == "-" or row.y == "-":
-                continue
-            x.append(float(item.x))
-            y.append(float(item.y))
-
-            if row.x < xMin:
-                xMin = row.x
-            if row.y < yMin:
-                yMin = row.y
-            if row.x > xMax:
-                xMax = row.x
-            if row.y > yMax:
-                yMax = row.y
+        theStatus.set("Running " + str(aTrial))
+        x.append(aTrial.x)
+        y.append(aTrial.y)
+
+    x = np.concatenate(x) if x else np.empty(0)  # join the trial columns in one go
+    y = np.concatenate(y) if y else np.empty(0)
+    if len(x) > 0:
+        xMin = min(xMin, x.min())
+        yMin = min(yMin, y.min())
+        xMax = max(xMax, x.max())
+        yMax = max(yMax, y.max())
 
     aFileName = "heatmap " + str(strftime("%Y_%m_%d %I_%M_%S_%p", localtime()))  # name of the log file for the run
     aTitle = fileDirectory
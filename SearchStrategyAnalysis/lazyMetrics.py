@@ -0,0 +1,148 @@
+# Module: lazyMetrics.py
+# Metric tables that compute each metric on first use, and a strategy cascade that only asks for what it needs
+
+import logging
+import numpy as np
+
+try:  # Tries to import local dependencies (pypi install)
+    from SearchStrategyAnalysis.searchMetrics import metricColumns, pathMetricGroups, goalMetricGroups, pathMetrics, \
+        goalMetrics, sampleRates, spatialEntropy, truncateAtGoal
+    from SearchStrategyAnalysis.classifier import strategyCriteria, strategyNames, strategyScores, notRecognized
+except:  # For local path
+    from searchMetrics import metricColumns, pathMetricGroups, goalMetricGroups, pathMetrics, goalMetrics, \
+        sampleRates, spatialEntropy, truncateAtGoal
+    from classifier import strategyCriteria, strategyNames, strategyScores, notRecognized
+
+
+def _selectTrials(t, x, y, offsets, trials):  # the samples and offsets of only the given trials, in that order
+    lengths = offsets[trials + 1] - offsets[trials]
+    selectedOffsets = np.zeros(len(trials) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=selectedOffsets[1:])
+    samples = np.repeat(offsets[trials] - selectedOffsets[:-1], lengths) + np.arange(selectedOffsets[-1])
+    return t[samples], x[samples], y[samples], selectedOffsets
+
+
+class LazyMetrics(object):
+    """ The experimentMetrics table of an experiment, computed a metric group at a time for the trials asked for.
+
+    Values are memoized per trial, so each metric of a trial is evaluated at most once. evaluations counts the
+    trials each metric was computed for, including metrics computed as a dependency (velocity and sampleRate for ipe)
+    or alongside another metric of the same group.
+    """
+
+    def __init__(self, t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                 fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam, truncate=False, coverageGridSize=None,
+                 circularCoverage=False):
+        # the sample rate and entropy are always taken over the whole trial
+        self.fullColumns = (np.asarray(t, dtype=float), np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                            np.asarray(offsets, dtype=np.int64))
+        if truncate:
+            self.columns = truncateAtGoal(*self.fullColumns, goalX, goalY, goalDiam)
+        else:
+            self.columns = self.fullColumns
+        self.goalX = goalX
+        self.goalY = goalY
+        self.mazeCentreX = mazeCentreX
+        self.mazeCentreY = mazeCentreY
+        self.corridorWidth = corridorWidth
+        self.chainingRadius = chainingRadius
+        self.fullThigmoZone = fullThigmoZone
+        self.smallThigmoZone = smallThigmoZone
+        self.mazeRadius = mazeRadius
+        self.goalDiam = goalDiam
+        self.coverageGridSize = coverageGridSize
+        self.circularCoverage = circularCoverage
+        self.trialCount = len(self.fullColumns[3]) - 1
+        self.values = {}
+        self.known = {}
+        self.evaluations = {}
+
+    def __len__(self):
+        return self.trialCount
+
+    def _missing(self, names, trials):  # the trials of trials without a value for one of names
+        missing = np.zeros(len(trials), dtype=bool)
+        for name in names:
+            if name in self.known:
+                missing |= ~self.known[name][trials]
+            else:
+                missing[:] = True
+        return trials[missing]
+
+    def _store(self, values, trials):
+        for name, column in values.items():
+            if name not in self.values:
+                self.values[name] = np.full(self.trialCount, np.nan)
+                self.known[name] = np.zeros(self.trialCount, dtype=bool)
+                self.evaluations[name] = 0
+            self.values[name][trials] = column
+            self.evaluations[name] += int(np.count_nonzero(~self.known[name][trials]))
+            self.known[name][trials] = True
+
+    def _compute(self, name, trials):  # computes the group of name for trials, which all lack it
+        if name == "sampleRate":
+            t, x, y, offsets = _selectTrials(*self.fullColumns, trials)
+            self._store({"sampleRate": sampleRates(t, offsets)}, trials)
+        elif name == "entropy":
+            t, x, y, offsets = _selectTrials(*self.fullColumns, trials)
+            self._store({"entropy": spatialEntropy(x, y, offsets, self.goalX, self.goalY)}, trials)
+        elif any(name in group for group in pathMetricGroups):
+            group = next(group for group in pathMetricGroups if name in group)
+            table = pathMetrics(*_selectTrials(*self.columns, trials), self.mazeCentreX, self.mazeCentreY,
+                                self.fullThigmoZone, self.smallThigmoZone, self.mazeRadius, self.coverageGridSize,
+                                self.circularCoverage, keys=group)
+            self._store({key: table[key].to_numpy() for key in group}, trials)
+        else:
+            group = next(group for group in goalMetricGroups if name in group)
+            velocity = sampleRate = np.zeros(len(trials))
+            if "ipe" in group:
+                velocity = self.get("velocity", trials)
+                sampleRate = self.get("sampleRate", trials)
+            results = goalMetrics(*_selectTrials(*self.columns, trials), self.goalX, self.goalY, self.mazeCentreX,
+                                  self.mazeCentreY, self.corridorWidth, self.chainingRadius, self.goalDiam, velocity,
+                                  sampleRate, keys=group)
+            self._store({key: results[key][:, 0] for key in group}, trials)
+
+    def get(self, name, trials=None):
+        """ The values of metric name for trials (all trials by default), computing the ones not yet known. """
+        trials = np.arange(self.trialCount) if trials is None else np.asarray(trials, dtype=np.int64)
+        missing = self._missing([name], trials)
+        if len(missing):
+            self._compute(name, missing)
+        return self.values[name][trials]
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def skippedEvaluations(self):
+        """ How many of the trials x metricColumns evaluations a full experimentMetrics table needs were not done. """
+        return self.trialCount * len(metricColumns) - sum(self.evaluations.get(name, 0) for name in metricColumns)
+
+
+def classifyLazily(metrics, params, mazeRadius):
+    """ classifyStrategies on a LazyMetrics table, asking only for the metrics the cascade needs.
+
+    Each condition is tested only on the trials that no earlier strategy has taken and that met the strategy's earlier
+    conditions, so trials settled early never have their later metrics computed. Returns the same as
+    classifyStrategies.
+    """
+    codes = np.full(len(metrics), len(strategyNames), dtype=np.int8)
+    unresolved = np.arange(len(metrics))
+    for code, (enabled, conditions) in enumerate(strategyCriteria(params, mazeRadius)):
+        if not enabled:
+            continue
+        candidates = unresolved
+        for condition in conditions:
+            if len(candidates) == 0:
+                break
+            candidates = candidates[condition(lambda name: metrics.get(name, candidates))]
+        codes[candidates] = code
+        unresolved = np.setdiff1d(unresolved, candidates, assume_unique=True)
+    logging.info("Lazy classification skipped " + str(metrics.skippedEvaluations()) + " of " +
+                 str(len(metrics) * len(metricColumns)) + " metric evaluations")
+
+    labels = strategyNames + [notRecognized]
+    strategies = np.array(labels)[codes]
+    scores = np.array(strategyScores + [0])[codes]
+    counts = {name: int(np.count_nonzero(codes == index)) for index, name in enumerate(labels)}
+    return strategies, scores, counts
@@ -0,0 +1,116 @@
+# Module: parameterSweep.py
+# Evaluates many strategy parameter sets against one metric table
+
+import copy
+import os
+import itertools
+import logging
+import traceback
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+try:  # Tries to import local dependencies (pypi install)
+    from SearchStrategyAnalysis.appTrial import _poolContext
+    from SearchStrategyAnalysis.classifier import strategyMasks, strategyNames, notRecognized
+except:  # For local path
+    from appTrial import _poolContext
+    from classifier import strategyMasks, strategyNames, notRecognized
+
+labels = strategyNames + [notRecognized]  # strategy codes index into this
+_sweepMetrics = None  # the metric table and maze radius of a sweep, set once per worker process
+_sweepMazeRadius = None
+
+
+def parameterGrid(base, values):
+    """ Every combination of values, a dict of Parameters field to a list of values, applied to a copy of base. """
+    fields = list(values)
+    parameterSets = []
+    for combination in itertools.product(*[values[field] for field in fields]):
+        params = copy.copy(base)
+        for field, value in zip(fields, combination):
+            setattr(params, field, value)
+        params.name = ", ".join(field + "=" + str(value) for field, value in zip(fields, combination))
+        parameterSets.append(params)
+    return parameterSets
+
+
+def randomParameters(base, ranges, count, seed=None):
+    """ count copies of base with each field of ranges drawn at random.
+
+    A (low, high) tuple is sampled uniformly, rounded if the base value is an int, and a list is sampled from.
+    """
+    generator = np.random.default_rng(seed)
+    parameterSets = []
+    for index in range(count):
+        params = copy.copy(base)
+        for field, fieldRange in ranges.items():
+            if isinstance(fieldRange, list):
+                value = fieldRange[generator.integers(len(fieldRange))]
+            else:
+                value = generator.uniform(fieldRange[0], fieldRange[1])
+                if isinstance(getattr(base, field), int) and not isinstance(getattr(base, field), bool):
+                    value = int(round(value))
+                else:
+                    value = float(value)
+            setattr(params, field, value)
+        params.name = "Random " + str(index)
+        parameterSets.append(params)
+    return parameterSets
+
+
+def _initSweepWorker(metrics, mazeRadius):
+    global _sweepMetrics
+    global _sweepMazeRadius
+    _sweepMetrics = metrics
+    _sweepMazeRadius = mazeRadius
+
+
+def _strategyCodes(params):  # the strategy code of every trial of the sweep's table
+    masks = strategyMasks(_sweepMetrics, params, _sweepMazeRadius)
+    return np.select(masks, np.arange(len(strategyNames), dtype=np.int8), default=len(strategyNames)).astype(np.int8)
+
+
+def sweepParameters(metrics, parameterSets, mazeRadius, baseline, workers=None):
+    """ Classifies the metric table with every parameter set, in a process pool.
+
+    Returns a DataFrame with one row per parameter set holding its name, the strategy counts and how many trials
+    changed strategy compared to baseline, and a DataFrame of those changes with one row per changed trial and set.
+    workers is the number of processes, None for one per core.
+    """
+    metrics = {key: np.asarray(column) for key, column in metrics.items()}
+    _initSweepWorker(metrics, mazeRadius)
+    baselineCodes = _strategyCodes(baseline)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    codeList = None
+    if workers > 1 and len(parameterSets) > 1:
+        chunksize = max(1, len(parameterSets) // (workers * 4))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=_poolContext(),
+                                                        initializer=_initSweepWorker,
+                                                        initargs=(metrics, mazeRadius)) as executor:
+                codeList = list(executor.map(_strategyCodes, parameterSets, chunksize=chunksize))
+        except Exception:
+            traceback.print_exc()
+            logging.warning("Parallel sweep failed, evaluating the parameter sets one at a time")
+    if codeList is None:
+        codeList = [_strategyCodes(params) for params in parameterSets]
+
+    rows = []
+    changes = []
+    for index, (params, codes) in enumerate(zip(parameterSets, codeList)):
+        counts = np.bincount(codes, minlength=len(labels))
+        changed = np.flatnonzero(codes != baselineCodes)
+        row = {"Set": index, "Name": str(params)}
+        row.update(zip(labels, counts.tolist()))
+        row["Changed"] = len(changed)
+        rows.append(row)
+        changes.append(pd.DataFrame({"Set": index, "Trial": changed,
+                                     "Baseline": np.array(labels)[baselineCodes[changed]],
+                                     "Strategy": np.array(labels)[codes[changed]]}))
+    if changes:
+        changes = pd.concat(changes, ignore_index=True)
+    else:
+        changes = pd.DataFrame(columns=["Set", "Trial", "Baseline", "Strategy"])
+    return pd.DataFrame(rows, columns=["Set", "Name"] + labels + ["Changed"]), changes
@@ -0,0 +1,646 @@
+# Module: searchMetrics.py
+# Vectorized search path metrics, computed from the t, x and y columns of a trial
+
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+
+idealDistanceCap = 1000000  # the ideal path sum stops growing once it passes this, as the original loop did
+
+
+def idealCumulativeDistance(startDistance, velocity, sampleRate, goalDiam):
+    """ Summed distance to the goal of an ideal path swum straight at the goal at the trial's velocity.
+
+    Closed form of the original loop, which added the distance and then moved velocity * sampleRate closer for as long
+    as the distance was outside the goal radius, stopping once the sum passed idealDistanceCap. The distances are an
+    arithmetic series, so the sum of the first m is m * d - step * m * (m - 1) / 2. Works elementwise on arrays.
+    """
+    startDistance, step = np.broadcast_arrays(np.asarray(startDistance, dtype=float),
+                                              np.asarray(velocity, dtype=float) * np.asarray(sampleRate, dtype=float))
+    radius = np.ceil(np.asarray(goalDiam, dtype=float) / 2)
+
+    def seriesSum(m):
+        return m * startDistance - step * m * (m - 1) / 2
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # terms until the ideal path reaches the goal, d - k * step > radius for k < terms
+        terms = np.where(step > 0, np.ceil((startDistance - radius) / step), np.inf)
+        terms = np.where(startDistance > radius, terms, 0)
+        # terms until the sum passes the cap, the smaller root of the series sum minus the cap
+        b = startDistance + step / 2
+        root = np.sqrt(b * b - 2 * step * idealDistanceCap)
+        capTerms = np.floor(2 * idealDistanceCap / (b + root)) + 1
+        capTerms = np.where(np.isfinite(capTerms) & (capTerms > 0), capTerms, np.inf)
+        capTerms = np.where(seriesSum(capTerms - 1) > idealDistanceCap, capTerms - 1, capTerms)  # rounding guards
+        capTerms = np.where(seriesSum(capTerms) > idealDistanceCap, capTerms, capTerms + 1)
+        terms = np.minimum(terms, capTerms)
+        terms = np.where(np.isfinite(terms), terms, 0)
+        total = seriesSum(terms)
+    return total if total.ndim else float(total)
+
+
+def idealPathError(t, x, y, goalX, goalY, goalDiam, truncate=False):
+    """ The ideal path error of one trial for one or many goal positions at once.
+
+    goalX and goalY broadcast against each other, the result has their shape. With truncate the path of each goal
+    stops at its first sample inside that goal. As in calculateValues the first step is measured from the origin and
+    the sample rate is taken over the whole trial.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    goalX, goalY = np.broadcast_arrays(np.asarray(goalX, dtype=float), np.asarray(goalY, dtype=float))
+    shape = goalX.shape
+    goalX, goalY = goalX.ravel(), goalY.ravel()
+    if len(t) == 0:
+        return np.zeros(shape) if shape else 0.0
+
+    distanceFromGoal = np.sqrt((goalX[None, :] - x[:, None]) ** 2 + (goalY[None, :] - y[:, None]) ** 2)
+    lengths = np.full(len(goalX), len(t))
+    if truncate:
+        inside = distanceFromGoal < float(goalDiam) / 2.0
+        lengths = np.where(inside.any(axis=0), inside.argmax(axis=0) + 1, len(t))
+        distanceFromGoal = np.where(np.arange(len(t))[:, None] < lengths[None, :], distanceFromGoal, 0.0)
+    distanceFromGoalSummed = distanceFromGoal.sum(axis=0)
+
+    previousX = np.concatenate(([0.0], x[:-1]))
+    previousY = np.concatenate(([0.0], y[:-1]))
+    totalDistance = np.cumsum(np.sqrt((previousX - x) ** 2 + (previousY - y) ** 2))[lengths - 1]
+    latency = t[lengths - 1] - t[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        velocity = np.where(latency != 0, totalDistance / latency, 0)
+    sampleRate = (t[-1] - t[0]) / (len(t) - 1) if len(t) > 1 else 1
+    startDistance = np.sqrt((goalX - x[0]) ** 2 + (goalY - y[0]) ** 2)
+
+    ipe = np.maximum((distanceFromGoalSummed - idealCumulativeDistance(startDistance, velocity, sampleRate, goalDiam))
+                     * sampleRate, 0)
+    return ipe.reshape(shape) if shape else float(ipe[0])
+
+
+metricsVersion = 2  # bump when a metric changes so cached metric tables are recomputed
+bitmapCoverageLimit = 1 << 26  # largest trials x cells bitmap, beyond it visited cells are found with np.unique
+
+
+def _legacyCoverage(x, y, trialIndex, trialCount, mazeCentreX, mazeCentreY, mazeRadius):
+    """ Per trial number of distinct cells of the original 10x10 grid that the path visits, capped at 100. """
+    spreadX = abs((mazeCentreX + mazeRadius) - (mazeCentreX - mazeRadius))
+    spreadY = abs((mazeCentreY + mazeRadius) - (mazeCentreY - mazeRadius))
+    cellX = np.round(((x - abs(mazeCentreX - mazeRadius)) / spreadX) * 10, 0) * 10
+    cellY = np.round(((y - abs(mazeCentreY - mazeRadius)) / spreadY) * 10, 0) * 10
+    cells = np.unique(np.column_stack((trialIndex, cellX + 0.0, cellY + 0.0)), axis=0)  # + 0.0 folds -0.0 into 0.0
+    return np.minimum(np.bincount(cells[:, 0].astype(int), minlength=trialCount), 100)
+
+
+def coverage(x, y, trialIndex, trialCount, mazeCentreX, mazeCentreY, mazeRadius, gridSize=None, circular=False):
+    """ Per trial percent of the maze traversed.
+
+    With gridSize None this is the original measure, the number of distinct cells of a 10x10 grid visited, capped at
+    100. Otherwise the square around the maze is split into gridSize x gridSize cells and the result is the percentage
+    of cells visited; with circular only the cells whose centre lies inside the maze count, so an arena that visits
+    every reachable cell scores 100.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    trialIndex = np.asarray(trialIndex, dtype=np.int64)
+    if len(x) == 0:
+        return np.zeros(trialCount, dtype=int if gridSize is None else float)
+    if gridSize is None:
+        return _legacyCoverage(x, y, trialIndex, trialCount, mazeCentreX, mazeCentreY, mazeRadius)
+
+    gridSize = int(gridSize)
+    cellSize = 2.0 * mazeRadius / gridSize
+    cellX = np.clip(np.floor((x - (mazeCentreX - mazeRadius)) / cellSize), 0, gridSize - 1).astype(np.int64)
+    cellY = np.clip(np.floor((y - (mazeCentreY - mazeRadius)) / cellSize), 0, gridSize - 1).astype(np.int64)
+    cells = cellX * gridSize + cellY  # linear cell index
+
+    reachable = np.ones(gridSize * gridSize, dtype=bool)
+    if circular:
+        centres = (np.arange(gridSize) + 0.5) * cellSize - mazeRadius
+        reachable = ((centres[:, None] ** 2 + centres[None, :] ** 2) <= mazeRadius ** 2).ravel()
+        keep = reachable[cells]
+        cells, trialIndex = cells[keep], trialIndex[keep]
+
+    keys = trialIndex * (gridSize * gridSize) + cells
+    if trialCount * gridSize * gridSize <= bitmapCoverageLimit:
+        bitmap = np.zeros(trialCount * gridSize * gridSize, dtype=bool)
+        bitmap[keys] = True
+        visited = np.count_nonzero(bitmap.reshape(trialCount, gridSize * gridSize), axis=1)
+    else:
+        visited = np.bincount(np.unique(keys) // (gridSize * gridSize), minlength=trialCount)
+    return 100.0 * visited / max(np.count_nonzero(reachable), 1)
+
+
+metricColumns = ["corridorAverage", "distanceAverage", "averageDistanceToSwimPathCentroid", "averageDistanceToCentre",
+                 "averageHeadingError", "percentTraversed", "quadrantTotal", "totalDistance", "latency",
+                 "fullThigmoCounter", "smallThigmoCounter", "annulusCounter", "sampleCount", "velocity", "ipe",
+                 "averageInitialHeadingError", "entropy", "truncatedLength"]  # the columns of a metric table
+goalBlockSize = 1 << 24  # float64 values goalMetrics may hold at once, so about goalBlockSize x 8 bytes at peak
+goalBlockLiveArrays = 8  # samples x goals temporaries alive together in one block of goals, measured peak is about 7
+pathColumns = ["averageDistanceToSwimPathCentroid", "averageDistanceToCentre", "percentTraversed", "quadrantTotal",
+               "totalDistance", "latency", "fullThigmoCounter", "smallThigmoCounter", "sampleCount", "velocity",
+               "truncatedLength"]
+# metrics that are computed together, so asking for one of a group computes the whole group
+pathMetricGroups = [("latency", "totalDistance", "velocity"),
+                    ("averageDistanceToCentre", "fullThigmoCounter", "smallThigmoCounter"), ("quadrantTotal",),
+                    ("percentTraversed",), ("averageDistanceToSwimPathCentroid",), ("sampleCount", "truncatedLength")]
+goalMetricGroups = [("distanceAverage", "ipe"), ("averageHeadingError", "corridorAverage", "averageInitialHeadingError"),
+                    ("annulusCounter",)]
+
+
+def _layout(offsets):  # trial lengths, first sample of each trial and the trial of each sample
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    return lengths, offsets[:-1], np.repeat(np.arange(len(lengths)), lengths)
+
+
+def trialChunks(offsets, chunkSamples):
+    """ Consecutive (first, last) trial ranges of at most chunkSamples samples each, at least one trial per range. """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    first = 0
+    while first < len(offsets) - 1:
+        last = int(np.searchsorted(offsets, offsets[first] + chunkSamples, side="right")) - 1
+        last = min(max(last, first + 1), len(offsets) - 1)
+        yield first, last
+        first = last
+
+
+def _segmentSum(values, starts, lengths):
+    """ Sums over each trial of per-sample values, or of a samples x goals matrix, 0 for empty trials. """
+    values = np.asarray(values, dtype=float)
+    sums = np.zeros((len(lengths),) + values.shape[1:])
+    nonEmpty = lengths > 0
+    if nonEmpty.any():
+        sums[nonEmpty] = np.add.reduceat(values, starts[nonEmpty], axis=0)
+    return sums
+
+
+def _previousPositions(x, y, starts, lengths):  # the position before each sample, the origin for a trial's first
+    first = np.zeros(len(x), dtype=bool)
+    first[starts[lengths > 0]] = True
+    previousX = np.where(first, 0.0, np.concatenate(([0.0], x[:-1])))
+    previousY = np.where(first, 0.0, np.concatenate(([0.0], y[:-1])))
+    return previousX, previousY, first
+
+
+def sampleRates(t, offsets):
+    """ Per trial mean time between samples, 1 for trials with fewer than two samples. """
+    t = np.asarray(t, dtype=float)
+    lengths, starts, trialIndex = _layout(offsets)
+    if len(t) == 0:
+        return np.ones(len(lengths))
+    first = t[np.minimum(starts, len(t) - 1)]
+    last = t[np.maximum(starts + lengths - 1, 0)]
+    return np.where(lengths > 1, (last - first) / np.maximum(lengths - 1, 1), 1)
+
+
+def truncateAtGoal(t, x, y, offsets, goalX, goalY, goalDiam):
+    """ Cuts every trial after its first sample inside the goal, returns the kept t, x, y and their offsets. """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    lengths, starts, trialIndex = _layout(offsets)
+    arrived = np.flatnonzero(np.sqrt((goalX - x) ** 2 + (goalY - y) ** 2) < float(goalDiam) / 2.0)
+    arrivedTrials, firstArrival = np.unique(trialIndex[arrived], return_index=True)
+    lengths = lengths.copy()
+    lengths[arrivedTrials] = arrived[firstArrival] - starts[arrivedTrials] + 1
+    keep = np.arange(len(t)) - starts[trialIndex] < lengths[trialIndex]
+    return t[keep], x[keep], y[keep], np.concatenate(([0], np.cumsum(lengths)))
+
+
+def _angleBetween(ax, ay, bx, by):
+    """ Angles in degrees between the vectors (ax, ay) and (bx, by), a zero vector has the unit vector (0, 0). """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aNorm = np.sqrt(ax * ax + ay * ay)
+        bNorm = np.sqrt(bx * bx + by * by)
+        aNorm[aNorm == 0] = np.inf
+        bNorm[bNorm == 0] = np.inf
+        cosine = (ax / aNorm) * (bx / bNorm) + (ay / aNorm) * (by / bNorm)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def headingAndCorridor(x, y, offsets, goalX, goalY, corridorWidth):
+    """ Heading error and angular corridor membership of every sample of every trial.
+
+    A sample updates the heading error only if the previous x is non zero and the step moves in x, both from the
+    previous sample and from the start, so zero-length steps and vertical segments never count. Other samples carry the
+    last heading error of their trial forward (0 before the first). Returns the per-sample heading errors and a boolean
+    mask of the samples inside the corridor of +/- corridorWidth degrees around the start-to-goal direction. For arrays
+    of goals both have a column per goal.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    manyGoals = np.ndim(goalX) > 0 or np.ndim(goalY) > 0
+    goalX, goalY = np.broadcast_arrays(np.atleast_1d(np.asarray(goalX, dtype=float)),
+                                       np.atleast_1d(np.asarray(goalY, dtype=float)))
+    lengths, starts, trialIndex = _layout(offsets)
+    if len(x) == 0:
+        shape = (0, len(goalX)) if manyGoals else (0,)
+        return np.zeros(shape), np.zeros(shape, dtype=bool)
+
+    previousX, previousY, first = _previousPositions(x, y, starts, lengths)
+    startX = x[starts[trialIndex]]
+    startY = y[starts[trialIndex]]
+
+    valid = (previousX != 0) & (x - previousX != 0) & (x - startX != 0) & ~first
+    headingError = np.abs(_angleBetween(goalX[None, :] - x[:, None], goalY[None, :] - y[:, None],
+                                        (x - previousX)[:, None], (y - previousY)[:, None]))
+
+    # the corridor is centred on the start-to-goal direction, 0 when the goal is straight above or below the start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        toGoalX = goalX[None, :] - startX[:, None]
+        aArcTangent = np.where(toGoalX != 0, np.degrees(np.arctan((goalY[None, :] - startY[:, None]) / toGoalX)), 0)
+        withinCorridor = np.degrees(np.arctan((y - startY) / (x - startX)))[:, None]
+    inCorridor = valid[:, None] & (aArcTangent - corridorWidth <= withinCorridor) & \
+        (withinCorridor <= aArcTangent + corridorWidth)
+
+    lastValid = np.maximum.accumulate(np.where(valid, np.arange(len(x)), -1))
+    currentHeadingError = np.where((lastValid >= starts[trialIndex])[:, None], headingError[np.maximum(lastValid, 0)],
+                                   0.0)
+    if manyGoals:
+        return currentHeadingError, inCorridor
+    return currentHeadingError[:, 0], inCorridor[:, 0]
+
+
+def spatialEntropy(x, y, offsets, goalX, goalY):
+    """ Per trial spatial entropy of the positions around the goal, as Entropy.m computed it.
+
+    With D the positions relative to the goal, this is log(mean |D|^2) + log(det(cov(D))) / 2, where the covariance is
+    the population covariance of D. Trials with fewer than two distinct positions have no finite entropy. For arrays
+    of goals the result has a column per goal; the covariance doesn't depend on the goal and is computed once.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    manyGoals = np.ndim(goalX) > 0 or np.ndim(goalY) > 0
+    goalX, goalY = np.broadcast_arrays(np.atleast_1d(np.asarray(goalX, dtype=float)),
+                                       np.atleast_1d(np.asarray(goalY, dtype=float)))
+    lengths, starts, trialIndex = _layout(offsets)
+    count = np.maximum(lengths, 1).astype(float)
+
+    xm = _segmentSum(x, starts, lengths) / count
+    ym = _segmentSum(y, starts, lengths) / count
+    dx = x - xm[trialIndex]
+    dy = y - ym[trialIndex]
+    xxm = _segmentSum(dx * dx, starts, lengths) / count
+    yym = _segmentSum(dy * dy, starts, lengths) / count
+    xym = _segmentSum(dx * dy, starts, lengths) / count
+    meanDistance2 = xxm[:, None] + yym[:, None] + (xm[:, None] - goalX[None, :]) ** 2 + \
+        (ym[:, None] - goalY[None, :]) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = np.log(meanDistance2) + 0.5 * np.log(xxm * yym - xym ** 2)[:, None]
+    entropy = np.where((lengths > 0)[:, None], entropy, np.nan)
+    return entropy if manyGoals else entropy[:, 0]
+
+
+def pathLength(t, x, y, offsets):
+    """ Per trial latency, distance covered and velocity.
+
+    The first step of each trial is measured from the origin, as the per-sample loop always did, and an empty trial
+    has a latency of 1.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    lengths, starts, trialIndex = _layout(offsets)
+    if len(t) > 0:
+        startTime = t[np.minimum(starts, len(t) - 1)]
+        latency = np.where(lengths > 0, t[np.maximum(starts + lengths - 1, 0)] - startTime, 1.0)
+    else:
+        latency = np.ones(len(lengths))
+    previousX, previousY, _ = _previousPositions(x, y, starts, lengths)
+    totalDistance = _segmentSum(np.sqrt((previousX - x) ** 2 + (previousY - y) ** 2), starts, lengths)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        velocity = np.where(latency != 0, totalDistance / latency, 0)
+    return latency, totalDistance, velocity
+
+
+def pathMetrics(t, x, y, offsets, mazeCentreX, mazeCentreY, fullThigmoZone, smallThigmoZone, mazeRadius,
+                coverageGridSize=None, circularCoverage=False, keys=None):
+    """ The metrics of every trial that don't depend on the goal, as a DataFrame with one row per trial.
+
+    Holds path length, latency, velocity, zone counts, quadrants, coverage and distances to the swim path centroid and
+    the maze centre, plus sampleCount and truncatedLength. With keys only the groups of pathMetricGroups holding one of
+    those metrics are computed.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    lengths, starts, trialIndex = _layout(offsets)
+    trialCount = len(lengths)
+    nonEmpty = lengths > 0
+    count = np.where(nonEmpty, lengths, 1).astype(float)
+    table = {"sampleCount": count, "truncatedLength": lengths}
+
+    def wanted(group):
+        return keys is None or any(key in keys for key in group)
+
+    def segmentSum(values):
+        return _segmentSum(values, starts, lengths)
+
+    def segmentCount(mask):
+        return np.bincount(trialIndex[mask], minlength=trialCount)
+
+    if wanted(pathMetricGroups[0]):
+        table["latency"], table["totalDistance"], table["velocity"] = pathLength(t, x, y, offsets)
+
+    # zones
+    if wanted(pathMetricGroups[1]):
+        distanceToCenterOfMaze = np.sqrt((mazeCentreX - x) ** 2 + (mazeCentreY - y) ** 2)
+        table["smallThigmoCounter"] = segmentCount(distanceToCenterOfMaze > smallThigmoZone).astype(float)
+        table["fullThigmoCounter"] = segmentCount(distanceToCenterOfMaze > fullThigmoZone).astype(float)
+        table["averageDistanceToCentre"] = segmentSum(distanceToCenterOfMaze) / count
+
+    if wanted(pathMetricGroups[2]):
+        east = x >= mazeCentreX
+        north = y >= mazeCentreY
+        table["quadrantTotal"] = (segmentCount(east & north) > 0).astype(int) + \
+            (segmentCount(~east & north) > 0).astype(int) + (segmentCount(east & ~north) > 0).astype(int) + \
+            (segmentCount(~east & ~north) > 0).astype(int)
+
+    if wanted(pathMetricGroups[3]):
+        table["percentTraversed"] = coverage(x, y, trialIndex, trialCount, mazeCentreX, mazeCentreY, mazeRadius,
+                                             coverageGridSize, circularCoverage)
+
+    # swim path centroid
+    if wanted(pathMetricGroups[4]):
+        xAv = segmentSum(x) / count
+        yAv = segmentSum(y) / count
+        table["averageDistanceToSwimPathCentroid"] = segmentSum(
+            np.sqrt((xAv[trialIndex] - x) ** 2 + (yAv[trialIndex] - y) ** 2)) / count
+
+    return pd.DataFrame({key: table[key] for key in pathColumns if key in table})
+
+
+def goalMetrics(t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius, goalDiam,
+                velocity, sampleRate, keys=None, blockSize=None):
+    """ The metrics of every trial that depend on the goal, for an array of goals at once.
+
+    velocity and sampleRate are per trial, from pathMetrics and sampleRates; goalDiam is one diameter or one per goal.
+    Returns a dict of trials x goals arrays: corridorAverage, distanceAverage, averageHeadingError, annulusCounter, ipe
+    and averageInitialHeadingError, or with keys only the groups of goalMetricGroups holding one of those metrics.
+    Goals are evaluated in blocks sized so the block's temporaries hold at most blockSize float64 values, about
+    blockSize x 8 bytes on top of the per-sample columns and the results; blockSize defaults to goalBlockSize.
+    """
+    def wanted(group):
+        return keys is None or any(key in keys for key in group)
+
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    goalX, goalY = np.broadcast_arrays(np.atleast_1d(np.asarray(goalX, dtype=float)),
+                                       np.atleast_1d(np.asarray(goalY, dtype=float)))
+    goalDiam = np.broadcast_to(np.asarray(goalDiam, dtype=float), goalX.shape)
+    lengths, starts, trialIndex = _layout(offsets)
+    nonEmpty = (lengths > 0)[:, None]
+    count = np.where(nonEmpty, lengths[:, None], 1).astype(float)
+    if wanted(goalMetricGroups[0]):
+        velocity = np.asarray(velocity, dtype=float)[:, None]
+        sampleRate = np.asarray(sampleRate, dtype=float)[:, None]
+        startX = np.where(nonEmpty[:, 0], x[np.minimum(starts, max(len(x) - 1, 0))], 0.0)[:, None] if len(x) > 0 \
+            else np.zeros((len(lengths), 1))
+        startY = np.where(nonEmpty[:, 0], y[np.minimum(starts, max(len(y) - 1, 0))], 0.0)[:, None] if len(y) > 0 \
+            else np.zeros((len(lengths), 1))
+    if wanted(goalMetricGroups[1]):
+        initial = (t < 1.0)[:, None]
+        initialHeadingErrorCount = np.bincount(trialIndex[initial[:, 0]], minlength=len(lengths))[:, None]
+    if wanted(goalMetricGroups[2]):
+        distanceToCenterOfMaze = np.sqrt((mazeCentreX - x) ** 2 + (mazeCentreY - y) ** 2)[:, None]
+
+    results = {key: np.zeros((len(lengths), len(goalX))) for group in goalMetricGroups if wanted(group)
+               for key in group}
+    if blockSize is None:
+        blockSize = goalBlockSize
+    blockSize = max(1, blockSize // (goalBlockLiveArrays * max(len(x), 1)))
+    for block in range(0, len(goalX), blockSize):
+        goals = slice(block, block + blockSize)
+        blockX, blockY = goalX[goals], goalY[goals]
+
+        if wanted(goalMetricGroups[0]):
+            distanceFromGoal = np.sqrt((blockX[None, :] - x[:, None]) ** 2 + (blockY[None, :] - y[:, None]) ** 2)
+            distanceFromGoalSummed = _segmentSum(distanceFromGoal, starts, lengths)
+            startDistance = np.where(nonEmpty, np.sqrt((blockX - startX) ** 2 + (blockY - startY) ** 2), 0)
+            ideal = idealCumulativeDistance(startDistance, velocity, sampleRate, goalDiam[goals])
+            results["distanceAverage"][:, goals] = distanceFromGoalSummed / count
+            results["ipe"][:, goals] = np.maximum((distanceFromGoalSummed - ideal) * sampleRate, 0)
+
+        if wanted(goalMetricGroups[1]):
+            currentHeadingError, inCorridor = headingAndCorridor(x, y, offsets, blockX, blockY, corridorWidth)
+            initialHeadingErrorSum = _segmentSum(np.where(initial, currentHeadingError, 0.0), starts, lengths)
+            results["corridorAverage"][:, goals] = _segmentSum(inCorridor, starts, lengths) / count
+            results["averageHeadingError"][:, goals] = _segmentSum(currentHeadingError, starts, lengths) / count
+            results["averageInitialHeadingError"][:, goals] = np.where(
+                initialHeadingErrorCount > 0, initialHeadingErrorSum / np.maximum(initialHeadingErrorCount, 1), 0)
+
+        if wanted(goalMetricGroups[2]):
+            distanceCenterToGoal = np.sqrt((mazeCentreX - blockX) ** 2 + (mazeCentreY - blockY) ** 2)
+            annulusZoneInner = distanceCenterToGoal - (chainingRadius / 2)
+            annulusZoneOuter = distanceCenterToGoal + (chainingRadius / 2)
+            results["annulusCounter"][:, goals] = _segmentSum((distanceToCenterOfMaze >= annulusZoneInner) &
+                                                              (distanceToCenterOfMaze <= annulusZoneOuter), starts,
+                                                              lengths)
+    return results
+
+
+def _metricTable(path, goal, column, entropy):  # joins the path metrics and one goal's metrics into a metric table
+    table = {key: (goal[key] if column is None else goal[key][:, column]) for key in goal}
+    table.update(path.items())
+    table["entropy"] = entropy
+    return pd.DataFrame({key: table[key] for key in metricColumns})
+
+
+def multiGoalMetrics(t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                     fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam, truncate=False, coverageGridSize=None,
+                     circularCoverage=False, blockSize=None):
+    """ The metric tables of every trial for an array of goals, one DataFrame per goal.
+
+    The goal-independent metrics are computed once and the goal-dependent ones for all goals together. With truncate
+    every trial is cut at a different sample for each goal, so nothing can be shared and each goal is computed on its
+    own. goalDiam is one diameter or one per goal, blockSize bounds memory as in goalMetrics.
+    """
+    goalX, goalY = np.broadcast_arrays(np.atleast_1d(np.asarray(goalX, dtype=float)),
+                                       np.atleast_1d(np.asarray(goalY, dtype=float)))
+    goalDiam = np.broadcast_to(np.asarray(goalDiam, dtype=float), goalX.shape)
+    if truncate:
+        return [experimentMetrics(t, x, y, offsets, goalX[index], goalY[index], mazeCentreX, mazeCentreY,
+                                  corridorWidth, chainingRadius, fullThigmoZone, smallThigmoZone, mazeRadius,
+                                  goalDiam[index], True, coverageGridSize, circularCoverage)
+                for index in range(len(goalX))]
+    path = pathMetrics(t, x, y, offsets, mazeCentreX, mazeCentreY, fullThigmoZone, smallThigmoZone, mazeRadius,
+                       coverageGridSize, circularCoverage)
+    goal = goalMetrics(t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                       goalDiam, path["velocity"].to_numpy(), sampleRates(t, offsets), blockSize=blockSize)
+    entropy = spatialEntropy(x, y, offsets, goalX, goalY)
+    return [_metricTable(path, goal, index, entropy[:, index]) for index in range(len(goalX))]
+
+
+def experimentMetrics(t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                      fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam, truncate=False, coverageGridSize=None,
+                      circularCoverage=False):
+    """ Computes the calculateValues metrics of every trial of an experiment at once.
+
+    t, x and y are the concatenated samples of all trials and trial i spans offsets[i]:offsets[i + 1], as stored by
+    Experiment. coverageGridSize and circularCoverage configure percentTraversed, see coverage. Returns a DataFrame with
+    one row per trial, see trialMetrics for the columns.
+    """
+    # the sample rate and entropy are always taken over the whole trial
+    sampleRate = sampleRates(t, offsets)
+    entropy = spatialEntropy(x, y, offsets, goalX, goalY)
+    if truncate:
+        t, x, y, offsets = truncateAtGoal(t, x, y, offsets, goalX, goalY, goalDiam)
+    path = pathMetrics(t, x, y, offsets, mazeCentreX, mazeCentreY, fullThigmoZone, smallThigmoZone, mazeRadius,
+                       coverageGridSize, circularCoverage)
+    goal = goalMetrics(t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                       goalDiam, path["velocity"].to_numpy(), sampleRate)
+    return _metricTable(path, goal, 0, entropy)
+
+
+def trialMetrics(t, x, y, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth, chainingRadius, fullThigmoZone,
+                 smallThigmoZone, mazeRadius, goalDiam, truncate=False, coverageGridSize=None, circularCoverage=False):
+    """ Computes the calculateValues metrics of one trial with array operations.
+
+    Returns a dict of the metrics. truncatedLength is the number of samples used: with truncate the path stops at the
+    first sample inside the goal, as in the original per-sample loops.
+    """
+    table = experimentMetrics(t, x, y, [0, len(t)], goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth,
+                              chainingRadius, fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam, truncate,
+                              coverageGridSize, circularCoverage)
+    return {key: column.iloc[0] for key, column in table.items()}
+
+
+def dataFingerprint(t, x, y, offsets):
+    """ Hash of the samples and trial boundaries of an experiment. """
+    digest = hashlib.sha1()
+    for column in (t, x, y):
+        digest.update(np.ascontiguousarray(column, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def metricTableKey(fingerprint, geometry):
+    """ Identifies a metric table: the data, the metric version and every experimentMetrics argument after offsets. """
+    key = [fingerprint, metricsVersion, list(geometry)]
+    return hashlib.sha1(json.dumps(key, default=str).encode("utf-8")).hexdigest()
+
+
+def saveMetricTable(path, table):
+    """ Writes a metric table to an .npz file, atomically. """
+    tempPath = path + "." + str(os.getpid()) + ".tmp"
+    with open(tempPath, "wb") as file:
+        np.savez(file, **{key: column.to_numpy() for key, column in table.items()})
+    os.replace(tempPath, path)
+
+
+def loadMetricTable(path):
+    """ Reads back a metric table written by saveMetricTable. """
+    with np.load(path, allow_pickle=False) as cached:
+        return pd.DataFrame({key: cached[key] for key in cached.files})
+
+
+def _cachePath(cacheDirectory, layer, fingerprint, geometry):  # where one layer's table of a data set and setup is kept
+    return os.path.join(cacheDirectory, layer + "-" + metricTableKey(fingerprint, geometry) + ".npz")
+
+
+def _loadCached(path):  # the table at path, None if there is none or it can't be read
+    if path is not None and os.path.isfile(path):
+        try:
+            table = loadMetricTable(path)
+            os.utime(path)  # marks it used, the cache directory is pruned least recently used first
+            return table
+        except Exception:
+            logging.error("Unreadable metric cache " + path)
+    return None
+
+
+def _saveCached(path, table):
+    if path is not None:
+        try:
+            saveMetricTable(path, table)
+        except Exception:
+            logging.error("Cannot write metric cache " + path)
+
+
+def cachedPathMetrics(cacheDirectory, fingerprint, t, x, y, offsets, mazeCentreX, mazeCentreY, fullThigmoZone,
+                      smallThigmoZone, mazeRadius, coverageGridSize=None, circularCoverage=False):
+    """ pathMetrics plus a sampleRate column, reusing the table of an earlier run on the same data and maze.
+
+    fingerprint is the dataFingerprint of the data, the table is only cached when cacheDirectory is set.
+    """
+    geometry = (mazeCentreX, mazeCentreY, fullThigmoZone, smallThigmoZone, mazeRadius, coverageGridSize,
+                circularCoverage)
+    path = _cachePath(cacheDirectory, "path", fingerprint, geometry) if cacheDirectory else None
+    table = _loadCached(path)
+    if table is None:
+        table = pathMetrics(t, x, y, offsets, mazeCentreX, mazeCentreY, fullThigmoZone, smallThigmoZone, mazeRadius,
+                            coverageGridSize, circularCoverage)
+        table["sampleRate"] = sampleRates(t, offsets)
+        _saveCached(path, table)
+    return table
+
+
+def cachedExperimentMetrics(cacheDirectory, t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth,
+                            chainingRadius, fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam, truncate=False,
+                            coverageGridSize=None, circularCoverage=False, fingerprint=None):
+    """ experimentMetrics, reusing the tables of an earlier run on the same data, see cachedMultiGoalMetrics.
+
+    The metrics don't depend on the strategy thresholds, so re-running with new parameters only reclassifies.
+    """
+    return cachedMultiGoalMetrics(cacheDirectory, t, x, y, offsets, [goalX], [goalY], mazeCentreX, mazeCentreY,
+                                  corridorWidth, chainingRadius, fullThigmoZone, smallThigmoZone, mazeRadius,
+                                  [goalDiam], truncate, coverageGridSize, circularCoverage,
+                                  fingerprint=fingerprint)[0]
+
+
+def cachedMultiGoalMetrics(cacheDirectory, t, x, y, offsets, goalX, goalY, mazeCentreX, mazeCentreY, corridorWidth,
+                           chainingRadius, fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam, truncate=False,
+                           coverageGridSize=None, circularCoverage=False, blockSize=None, fingerprint=None):
+    """ multiGoalMetrics for lists of goal positions and diameters, cached in two layers.
+
+    The goal-independent metrics are kept under a key of the data and maze, and each goal's metrics under a key of the
+    data, goal, corridor width and chaining radius, so changing only the goal recomputes only its part. Goals with a
+    cached table are loaded and the rest are computed together, blockSize bounds their memory as in goalMetrics. With
+    truncate every metric depends on the goal, so each goal's whole table is kept under a key of every argument.
+    fingerprint identifies the data, e.g. the archiveKey of an experiment opened from an archive; without one the
+    samples are hashed with dataFingerprint.
+    """
+    if cacheDirectory and fingerprint is None:
+        fingerprint = dataFingerprint(t, x, y, offsets)
+    if truncate:
+        tables = []
+        for index in range(len(goalX)):
+            geometry = (goalX[index], goalY[index], mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                        fullThigmoZone, smallThigmoZone, mazeRadius, goalDiam[index], truncate, coverageGridSize,
+                        circularCoverage)
+            path = _cachePath(cacheDirectory, "metrics", fingerprint, geometry) if cacheDirectory else None
+            table = _loadCached(path)
+            if table is None:
+                table = experimentMetrics(t, x, y, offsets, *geometry)
+                _saveCached(path, table)
+            tables.append(table)
+        return tables
+
+    pathTable = cachedPathMetrics(cacheDirectory, fingerprint, t, x, y, offsets, mazeCentreX, mazeCentreY,
+                                  fullThigmoZone, smallThigmoZone, mazeRadius, coverageGridSize, circularCoverage)
+    paths = [None] * len(goalX)
+    goalTables = [None] * len(goalX)
+    if cacheDirectory:
+        for index in range(len(goalX)):
+            geometry = (goalX[index], goalY[index], mazeCentreX, mazeCentreY, corridorWidth, chainingRadius,
+                        goalDiam[index])
+            paths[index] = _cachePath(cacheDirectory, "goal", fingerprint, geometry)
+            goalTables[index] = _loadCached(paths[index])
+    missing = [index for index in range(len(goalX)) if goalTables[index] is None]
+    if missing:
+        missingX = np.array([goalX[index] for index in missing], dtype=float)
+        missingY = np.array([goalY[index] for index in missing], dtype=float)
+        goal = goalMetrics(t, x, y, offsets, missingX, missingY, mazeCentreX, mazeCentreY, corridorWidth,
+                           chainingRadius, np.array([goalDiam[index] for index in missing], dtype=float),
+                           pathTable["velocity"].to_numpy(), pathTable["sampleRate"].to_numpy(),
+                           blockSize=blockSize)
+        goal["entropy"] = spatialEntropy(x, y, offsets, missingX, missingY)
+        for column, index in enumerate(missing):
+            goalTables[index] = pd.DataFrame({key: values[:, column] for key, values in goal.items()})
+            _saveCached(paths[index], goalTables[index])
+    return [_metricTable(pathTable, goalTable, None, goalTable["entropy"]) for goalTable in goalTables]
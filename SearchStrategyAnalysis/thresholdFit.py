@@ -0,0 +1,146 @@
+# Module: thresholdFit.py
+# Fits strategy thresholds to manually categorized trials
+
+import copy
+import os
+import logging
+import traceback
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+try:  # Tries to import local dependencies (pypi install)
+    from SearchStrategyAnalysis.appTrial import _poolContext, writeParameterFile
+    from SearchStrategyAnalysis.classifier import strategyMasks, strategyNames
+    from SearchStrategyAnalysis.parameterSweep import labels, parameterGrid, randomParameters
+except:  # For local path
+    from appTrial import _poolContext, writeParameterFile
+    from classifier import strategyMasks, strategyNames
+    from parameterSweep import labels, parameterGrid, randomParameters
+
+_fitMetrics = None  # the labelled metric rows, maze radius and manual strategy codes, set once per worker process
+_fitMazeRadius = None
+_fitManualCodes = None
+
+
+def manualStrategyCode(label):  # index of a manual label in labels, -1 if it is empty or not a strategy
+    label = str(label).strip()
+    if label.endswith("(m)"):  # the manual Directed Search button adds this
+        label = label[:-3].strip()
+    for code, name in enumerate(labels):
+        if label.lower() == name.lower():
+            return code
+    return -1
+
+
+def readManualLabels(filename):  # the manual strategy codes of a results csv, one per trial, -1 for unlabelled trials
+    results = pd.read_csv(filename, usecols=["Strategy (manual)"], dtype=str, keep_default_na=False)
+    return np.array([manualStrategyCode(label) for label in results["Strategy (manual)"]], dtype=np.int8)
+
+
+def confusionMatrix(manualCodes, codes):
+    """ Counts of every manual strategy (rows) against the assigned strategy (columns) for the labelled trials. """
+    manualCodes = np.asarray(manualCodes)
+    labelled = manualCodes >= 0
+    counts = np.bincount(manualCodes[labelled].astype(int) * len(labels) + np.asarray(codes)[labelled],
+                         minlength=len(labels) * len(labels))
+    return pd.DataFrame(counts.reshape(len(labels), len(labels)), index=labels, columns=labels)
+
+
+def _initFitWorker(metrics, mazeRadius, manualCodes):
+    global _fitMetrics
+    global _fitMazeRadius
+    global _fitManualCodes
+    _fitMetrics = metrics
+    _fitMazeRadius = mazeRadius
+    _fitManualCodes = manualCodes
+
+
+def _codes(params):  # strategy codes of the labelled trials
+    masks = strategyMasks(_fitMetrics, params, _fitMazeRadius)
+    return np.select(masks, np.arange(len(strategyNames)), default=len(strategyNames))
+
+
+def _agreement(params):  # number of labelled trials whose strategy matches the manual one
+    return int(np.count_nonzero(_codes(params) == _fitManualCodes))
+
+
+def _evaluate(parameterSets, workers):  # agreement of every parameter set, in a process pool when workers > 1
+    if workers > 1 and len(parameterSets) > 1:
+        chunksize = max(1, len(parameterSets) // (workers * 4))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=_poolContext(),
+                                                        initializer=_initFitWorker,
+                                                        initargs=(_fitMetrics, _fitMazeRadius,
+                                                                  _fitManualCodes)) as executor:
+                return list(executor.map(_agreement, parameterSets, chunksize=chunksize))
+        except Exception:
+            traceback.print_exc()
+            logging.warning("Parallel fitting failed, evaluating the parameter sets one at a time")
+    return [_agreement(params) for params in parameterSets]
+
+
+def _candidateValues(base, field, fieldRange, steps):  # the values coordinate descent tries for one field
+    if isinstance(fieldRange, list):
+        return fieldRange
+    values = np.linspace(fieldRange[0], fieldRange[1], steps)
+    if isinstance(getattr(base, field), int) and not isinstance(getattr(base, field), bool):
+        return sorted(set(int(round(value)) for value in values))
+    return [float(value) for value in values]
+
+
+def fitThresholds(metrics, manualCodes, mazeRadius, base, ranges, method="coordinate", count=10000, steps=25,
+                  rounds=3, workers=None, seed=None, filename=None):
+    """ Searches the Parameters fields in ranges for the best agreement with the manual strategies.
+
+    metrics is a metric table with one row per trial and manualCodes the matching manual strategy codes, see
+    readManualLabels; only labelled trials are used. ranges maps a field to a (low, high) tuple or a list of values.
+    method is "grid" (every combination of lists), "random" (count random sets) or "coordinate" (rounds of trying
+    steps values of one field at a time, keeping the best), using workers processes, None for one per core. The best
+    parameters are written to filename if one is given. Returns the best Parameters, the fraction of labelled trials
+    it agrees on and its confusion matrix.
+    """
+    manualCodes = np.asarray(manualCodes)
+    labelled = manualCodes >= 0
+    _initFitWorker({key: np.asarray(column)[labelled] for key, column in metrics.items()}, mazeRadius,
+                   manualCodes[labelled])
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    best = copy.copy(base)
+    bestAgreement = _agreement(best)
+    if method == "grid":
+        parameterSets = parameterGrid(base, ranges)
+    elif method == "random":
+        parameterSets = randomParameters(base, ranges, count, seed)
+    elif method == "coordinate":
+        parameterSets = []
+        for fitRound in range(rounds):
+            improved = False
+            for field, fieldRange in ranges.items():
+                candidates = []
+                for value in _candidateValues(base, field, fieldRange, steps):
+                    params = copy.copy(best)
+                    setattr(params, field, value)
+                    candidates.append(params)
+                agreements = _evaluate(candidates, workers)
+                index = int(np.argmax(agreements))
+                if agreements[index] > bestAgreement:
+                    best, bestAgreement, improved = candidates[index], agreements[index], True
+            logging.info("Threshold fit round " + str(fitRound + 1) + ": " + str(bestAgreement) + " trials agree")
+            if not improved:
+                break
+    else:
+        raise ValueError("Unknown fitting method " + str(method))
+    if parameterSets:
+        agreements = _evaluate(parameterSets, workers)
+        index = int(np.argmax(agreements))
+        if agreements[index] > bestAgreement:
+            best, bestAgreement = parameterSets[index], agreements[index]
+
+    best = copy.copy(best)
+    best.name = "Fitted"
+    if filename is not None:
+        writeParameterFile(best, filename)
+    return best, bestAgreement / max(np.count_nonzero(labelled), 1), confusionMatrix(manualCodes[labelled],
+                                                                                     _codes(best))
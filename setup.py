@@ -32,6 +32,7 @@ setup(
         'pillow',
         'matplotlib',
         'scipy',
+        'numpy',
     ],
     long_description=long_description,
     long_description_content_type='text/markdown',